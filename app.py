@@ -1,30 +1,162 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_file
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_file, Response, stream_with_context, abort, g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
+from werkzeug.utils import secure_filename
+from datetime import datetime, timedelta, timezone
+import bisect
+import click
+import codecs
 import json
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
-from reportlab.pdfgen import canvas
+import csv
+import hashlib
 import io
 import os
+import re
+import socket
+import textwrap
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
+from types import SimpleNamespace
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here-change-in-production'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///database.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SHOP_NAME'] = "Haideri Battery Store"
 app.config['SHOP_ADDRESS'] = "NoorKot Road, Sakhargarh"
 app.config['SALESMAN_NAME'] = "Musawar Apal"
 app.config['PHONE_NUMBER'] = "03005016501"
+app.config['DASHBOARD_CACHE_TTL'] = 30  # Seconds to reuse dashboard counters
+app.config['TIMEZONE'] = None  # Shop timezone, e.g. 'Asia/Karachi' (None = server local time)
+app.config['BATTERY_CACHE_SIZE'] = 2048  # Barcodes kept in each worker's lookup cache
+app.config['BATTERY_CACHE_CHECK_INTERVAL'] = 1.0  # Seconds between shared generation checks
+app.config['SCAN_BATCH_LIMIT'] = 100  # Most barcodes resolved by one /scan request
+app.config['PAGE_SIZE'] = 50  # Rows per page on inventory and scrap lists
+app.config['EXPORT_BATCH_SIZE'] = 1000  # Rows fetched per batch when streaming exports
+app.config['IMPORT_BATCH_SIZE'] = 1000  # Rows written per transaction by the CSV import
+app.config['INVOICE_CACHE_DIR'] = os.path.join(app.instance_path, 'invoice_cache')
+app.config['INVOICE_CACHE_MAX_BYTES'] = 200 * 1024 * 1024  # Rendered PDFs kept on disk
+app.config['INVOICE_CACHE_SCAN_INTERVAL'] = 300  # Seconds before a worker re-measures the shared PDF cache
+app.config['INVOICE_TEMPLATE_VERSION'] = 2  # Bump when the PDF layout changes
+app.config['THERMAL_PRINTER'] = None  # 'tcp://host:9100', a device/spool file path, or None to print the thermal PDF
+app.config['THERMAL_LINE_WIDTH'] = 32  # Characters per line (32 for 58mm paper, 48 for 80mm)
+app.config['PDF_RENDER_PROCESSES'] = None  # Processes for batch PDF rendering (None = CPU count)
+app.config['PDF_RENDER_POOL_IDLE'] = 60  # Seconds without a batch before a worker stops its render processes
+app.config['PDF_JOB_EXECUTOR'] = 'thread'  # Background PDF jobs run on a 'thread' or 'process' pool
+app.config['PDF_JOB_WORKERS'] = 2  # Background PDF jobs rendered at once per gunicorn worker
+app.config['PDF_JOB_TIMEOUT'] = 120  # Seconds before a pending PDF job counts as failed
+app.config['JINJA_CACHE_DIR'] = os.path.join(app.instance_path, 'jinja_cache')  # Compiled templates (None to disable)
+app.config['SQLITE_PROFILE'] = 'wal'  # Connection pragma profile, see SQLITE_PROFILES
+app.config['SQLITE_PRAGMAS'] = {}  # Pragmas overriding the profile, e.g. {'busy_timeout': 10000}
+app.config['SQLITE_CHECKPOINT_INTERVAL'] = 60  # Seconds between background WAL checkpoints (None to disable)
+app.config['SQLITE_WAL_TRUNCATE_BYTES'] = 64 * 1024 * 1024  # WAL size to truncate once fully checkpointed with no readers
+app.config['METRICS_ENABLED'] = True  # Record per-endpoint latency and SQL counts for /metrics
+app.config['METRICS_BUCKETS'] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # Latency histogram bounds (s)
+app.config['SLOW_QUERY_THRESHOLD_MS'] = None  # Log statements slower than this (None = off)
+app.config['SLOW_QUERY_LOG'] = os.path.join(app.instance_path, 'slow_queries.log')
+app.config['SLOW_QUERY_LOG_BYTES'] = 5 * 1024 * 1024  # Size at which the slow-query log rotates
+app.config['SLOW_QUERY_LOG_BACKUPS'] = 5  # Rotated slow-query logs kept
+app.config['SLOW_QUERY_SCAN_TABLES'] = ('sale', 'battery', 'scrap_inventory')  # Full scans flagged in the log
+app.config['PROFILER_TOP'] = 30  # Functions listed when an admin adds ?profile to a page
+
+# Persist compiled templates so cold starts skip Jinja compilation
+if app.config['JINJA_CACHE_DIR']:
+    from jinja2 import FileSystemBytecodeCache
+    os.makedirs(app.config['JINJA_CACHE_DIR'], exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['JINJA_CACHE_DIR'])
 
 db = SQLAlchemy(app)
 
+# SQLite connection profiles. Pragmas are applied in order, busy_timeout
+# first so switching the journal mode waits for other connections.
+SQLITE_PROFILES = {
+    # What the app used before: rollback journal, so a long read blocks writers
+    'default': {'journal_mode': 'DELETE'},
+    # Write-ahead log: readers and the writer no longer block each other
+    'wal': {
+        'busy_timeout': 5000,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # Negative values are KiB
+    },
+}
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas):
+    """Run PRAGMA name = value for each pragma on a raw sqlite3 connection"""
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+    cursor.close()
+
+def sqlite_pragmas():
+    """Pragmas of the configured profile plus SQLITE_PRAGMAS overrides"""
+    return {**SQLITE_PROFILES[app.config['SQLITE_PROFILE']], **app.config['SQLITE_PRAGMAS']}
+
+def on_sqlite_connect(dbapi_connection, connection_record):
+    pragmas = sqlite_pragmas()
+    apply_sqlite_pragmas(dbapi_connection, pragmas)
+    if str(pragmas.get('journal_mode', '')).upper() == 'WAL':
+        start_wal_checkpointer()
+
+# Background WAL checkpoints. SQLite's own auto-checkpoint runs inside
+# whichever request commits past 1000 pages; checkpointing from a thread
+# keeps that work off requests. Only PASSIVE checkpoints run while the shop
+# is open, since the other modes hold the write lock while waiting for
+# readers; the wal-checkpoint command does a full TRUNCATE off-hours.
+_wal_checkpointer_pid = None
+
+def wal_checkpoint(mode='PASSIVE', wait=True):
+    """Checkpoint the WAL, returning SQLite's (busy, log pages, checkpointed pages).
+    
+    With wait=False the checkpoint gives up at once instead of waiting
+    busy_timeout for readers and writers.
+    """
+    with db.engine.connect() as conn:
+        if wait:
+            return tuple(conn.exec_driver_sql(f'PRAGMA wal_checkpoint({mode})').one())
+        conn.exec_driver_sql('PRAGMA busy_timeout = 0')
+        try:
+            return tuple(conn.exec_driver_sql(f'PRAGMA wal_checkpoint({mode})').one())
+        finally:
+            conn.exec_driver_sql(f"PRAGMA busy_timeout = {sqlite_pragmas().get('busy_timeout', 0)}")
+
+def wal_checkpoint_loop(interval):
+    with app.app_context():
+        wal_path = db.engine.url.database + '-wal'
+        while True:
+            time.sleep(interval)
+            try:
+                wal_size = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+                if not wal_size:
+                    continue
+                busy, log_pages, checkpointed = wal_checkpoint('PASSIVE')
+                # Every frame is back in the database and no reader still needs
+                # the log, so truncating only has to reset it; skip it if a
+                # connection got in first rather than wait
+                if not busy and log_pages == checkpointed and wal_size >= app.config['SQLITE_WAL_TRUNCATE_BYTES']:
+                    wal_checkpoint('TRUNCATE', wait=False)
+            except Exception as e:
+                print(f"WAL checkpoint failed: {e}")
+
+def start_wal_checkpointer():
+    """Start this process's checkpoint thread once (again after a fork)"""
+    global _wal_checkpointer_pid
+    interval = app.config['SQLITE_CHECKPOINT_INTERVAL']
+    if not interval or _wal_checkpointer_pid == os.getpid():
+        return
+    _wal_checkpointer_pid = os.getpid()
+    threading.Thread(target=wal_checkpoint_loop, args=(interval,), name='wal-checkpoint', daemon=True).start()
+
+with app.app_context():
+    if db.engine.dialect.name == 'sqlite':
+        from sqlalchemy import event
+        event.listen(db.engine, 'connect', on_sqlite_connect)
+
 # Initialize Login Manager
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -53,7 +185,7 @@ class Battery(db.Model):
     barcode = db.Column(db.String(100), unique=True, nullable=False)
     name = db.Column(db.String(200), nullable=False)
     model = db.Column(db.String(100))
-    company = db.Column(db.String(100))
+    company = db.Column(db.String(100), index=True)
     weight = db.Column(db.Float)
     purchase_price = db.Column(db.Float, nullable=False)
     selling_price = db.Column(db.Float, nullable=False)
@@ -73,7 +205,31 @@ class Sale(db.Model):
     total = db.Column(db.Float, nullable=False)
     payment_method = db.Column(db.String(50))
     created_by = db.Column(db.String(100))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    lines = db.relationship('SaleLine', backref='sale', lazy=True, order_by='SaleLine.id')
+
+class SaleLine(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    sale_id = db.Column(db.Integer, db.ForeignKey('sale.id'), nullable=False, index=True)
+    barcode = db.Column(db.String(100), index=True)
+    name = db.Column(db.String(200))
+    model = db.Column(db.String(100))
+    quantity = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Float, nullable=False)  # Unit price at time of sale
+    total = db.Column(db.Float, nullable=False)
+
+class InvoiceCounter(db.Model):
+    day = db.Column(db.String(8), primary_key=True)  # YYYYMMDD
+    last_number = db.Column(db.Integer, nullable=False, default=0)
+
+class CacheGeneration(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+class SchemaVersion(db.Model):
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(200))
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class ScrapInventory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -90,112 +246,793 @@ class ScrapInventory(db.Model):
 def load_user(user_id):
     return User.query.get(int(user_id))
 
-def init_database():
-    """Initialize database with all required tables and columns"""
-    with app.app_context():
-        try:
-            # First, create all tables (if they don't exist)
-            db.create_all()
-            
-            # Check if scrap_deduction column exists in Sale table
-            # Use SQLAlchemy's inspector instead of direct SQLite connection
-            from sqlalchemy import inspect
-            
-            inspector = inspect(db.engine)
-            columns = [col['name'] for col in inspector.get_columns('sale')]
-            
-            if 'scrap_deduction' not in columns:
-                print("Adding scrap_deduction column to sale table...")
-                
-                # Use SQLAlchemy's text() for safe SQL execution
-                from sqlalchemy import text
-                
-                with db.engine.connect() as conn:
-                    # Try different SQL approaches
-                    try:
-                        conn.execute(text("ALTER TABLE sale ADD COLUMN scrap_deduction FLOAT DEFAULT 0"))
-                        conn.commit()
-                        print("✓ scrap_deduction column added successfully")
-                    except Exception as e:
-                        print(f"Could not add column using standard SQL: {e}")
-                        
-                        # Try alternative approach
-                        try:
-                            # Create a temporary table with the new schema
-                            conn.execute(text("""
-                                CREATE TABLE sale_new (
-                                    id INTEGER PRIMARY KEY,
-                                    invoice_number VARCHAR(50) UNIQUE NOT NULL,
-                                    customer_name VARCHAR(200),
-                                    customer_phone VARCHAR(20),
-                                    items TEXT,
-                                    subtotal FLOAT NOT NULL,
-                                    discount FLOAT DEFAULT 0,
-                                    scrap_deduction FLOAT DEFAULT 0,
-                                    total FLOAT NOT NULL,
-                                    payment_method VARCHAR(50),
-                                    created_by VARCHAR(100),
-                                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                                )
-                            """))
-                            
-                            # Copy data from old table
-                            conn.execute(text("""
-                                INSERT INTO sale_new 
-                                SELECT id, invoice_number, customer_name, customer_phone, 
-                                       items, subtotal, discount, 0, total, 
-                                       payment_method, created_by, created_at 
-                                FROM sale
-                            """))
-                            
-                            # Drop old table and rename new one
-                            conn.execute(text("DROP TABLE sale"))
-                            conn.execute(text("ALTER TABLE sale_new RENAME TO sale"))
-                            conn.commit()
-                            print("✓ Table recreated with scrap_deduction column")
-                        except Exception as e2:
-                            print(f"Could not recreate table: {e2}")
-            
-            # Create admin user if not exists
-            if not User.query.filter_by(username='admin').first():
-                admin = User(
-                    username='admin',
-                    password=generate_password_hash('admin123'),
-                    role='admin'
-                )
-                db.session.add(admin)
-                db.session.commit()
-                print("✓ Admin user created: username='admin', password='admin123'")
-                
-        except Exception as e:
-            print(f"Error during database initialization: {e}")
-            # Try to create everything from scratch
+def sale_line_rows(sale_id, items):
+    """Convert cart items (as posted by billing.html) into sale_line rows"""
+    rows = []
+    for item in items:
+        quantity = int(item.get('quantity', 0))
+        price = float(item.get('price', 0))
+        rows.append({
+            'sale_id': sale_id,
+            'barcode': item.get('barcode'),
+            'name': item.get('name'),
+            'model': item.get('model'),
+            'quantity': quantity,
+            'price': price,
+            'total': float(item.get('total', price * quantity))
+        })
+    return rows
+
+def backfill_sale_lines(batch_size=1000):
+    """Expand legacy Sale.items JSON into sale_line rows for sales that have none"""
+    from sqlalchemy import exists, select
+    
+    migrated = 0
+    last_id = 0
+    while True:
+        batch = db.session.execute(
+            select(Sale.id, Sale.items)
+            .where(Sale.id > last_id, ~exists().where(SaleLine.sale_id == Sale.id))
+            .order_by(Sale.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            break
+        
+        rows = []
+        for sale_id, items in batch:
             try:
-                db.drop_all()
-                db.create_all()
-                print("✓ Database recreated from scratch")
-                
-                # Create admin user
-                admin = User(
-                    username='admin',
-                    password=generate_password_hash('admin123'),
-                    role='admin'
-                )
-                db.session.add(admin)
-                db.session.commit()
-                print("✓ Admin user created")
-            except Exception as e2:
-                print(f"Fatal error: Could not initialize database: {e2}")
-# Custom Jinja2 filter for JSON parsing
-@app.template_filter('fromjson')
-def from_json(value):
+                rows.extend(sale_line_rows(sale_id, json.loads(items or '[]')))
+            except (ValueError, TypeError, AttributeError) as e:
+                print(f"Skipping sale {sale_id}: could not parse items ({e})")
+        if rows:
+            db.session.execute(SaleLine.__table__.insert(), rows)
+        db.session.commit()
+        
+        migrated += len(batch)
+        last_id = batch[-1][0]
+    return migrated
+
+def seed_invoice_counters():
+    """Start each day's invoice counter after its highest existing invoice"""
+    from sqlalchemy import text
+    
+    db.session.execute(text("""
+        INSERT INTO invoice_counter (day, last_number)
+        SELECT substr(invoice_number, 5, 8), max(cast(substr(invoice_number, 14) AS INTEGER))
+        FROM sale
+        WHERE invoice_number LIKE 'INV-________-%'
+        GROUP BY substr(invoice_number, 5, 8)
+        ON CONFLICT (day) DO UPDATE SET last_number = max(last_number, excluded.last_number)
+    """))
+    db.session.commit()
+
+def next_invoice_number(day):
+    """Allocate the next invoice number for a YYYYMMDD day.
+    
+    A single upsert ... RETURNING bumps the day's counter inside the caller's
+    transaction, so concurrent workers never hand out the same number and a
+    rolled-back sale gives its number back.
+    """
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+    
+    stmt = sqlite_insert(InvoiceCounter).values(day=day, last_number=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[InvoiceCounter.day],
+        set_={'last_number': InvoiceCounter.last_number + 1}
+    ).returning(InvoiceCounter.last_number)
+    number = db.session.execute(stmt).scalar_one()
+    return f'INV-{day}-{number:04d}'
+
+def begin_immediate():
+    """Open the session's transaction with BEGIN IMMEDIATE so SQLite takes the write lock up front"""
+    conn = db.session.connection()
+    if not conn.connection.driver_connection.in_transaction:
+        conn.exec_driver_sql('BEGIN IMMEDIATE')
+
+def decrement_stock(requested):
+    """Subtract quantities ({barcode: quantity}) from stock in one conditional executemany.
+    
+    Each row only changes while quantity >= the requested amount; the number
+    of rows actually updated is returned so callers can detect a shortfall.
+    """
+    from sqlalchemy import bindparam
+    
+    battery_table = Battery.__table__
+    stmt = battery_table.update().where(
+        battery_table.c.barcode == bindparam('b_barcode'),
+        battery_table.c.quantity >= bindparam('b_quantity')
+    ).values(quantity=battery_table.c.quantity - bindparam('b_quantity'))
+    result = db.session.execute(stmt, [
+        {'b_barcode': barcode, 'b_quantity': quantity}
+        for barcode, quantity in requested.items()
+    ])
+    return result.rowcount
+
+# Full-text search over battery barcode, name, model and company
+_battery_fts_available = None
+
+BATTERY_FTS_DDL = [
+    """CREATE VIRTUAL TABLE battery_fts USING fts5(
+        barcode, name, model, company,
+        content='battery', content_rowid='id'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS battery_fts_ai AFTER INSERT ON battery BEGIN
+        INSERT INTO battery_fts (rowid, barcode, name, model, company)
+        VALUES (new.id, new.barcode, new.name, new.model, new.company);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS battery_fts_ad AFTER DELETE ON battery BEGIN
+        INSERT INTO battery_fts (battery_fts, rowid, barcode, name, model, company)
+        VALUES ('delete', old.id, old.barcode, old.name, old.model, old.company);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS battery_fts_au AFTER UPDATE OF barcode, name, model, company ON battery BEGIN
+        INSERT INTO battery_fts (battery_fts, rowid, barcode, name, model, company)
+        VALUES ('delete', old.id, old.barcode, old.name, old.model, old.company);
+        INSERT INTO battery_fts (rowid, barcode, name, model, company)
+        VALUES (new.id, new.barcode, new.name, new.model, new.company);
+    END""",
+    "INSERT INTO battery_fts (battery_fts) VALUES ('rebuild')",
+]
+
+def setup_battery_search():
+    """Create the FTS5 index and its sync triggers, returning False if SQLite lacks FTS5"""
+    from sqlalchemy import inspect, text
+    from sqlalchemy.exc import OperationalError
+    
+    if inspect(db.engine).has_table('battery_fts'):
+        return True
+    try:
+        with db.engine.begin() as conn:
+            for statement in BATTERY_FTS_DDL:
+                conn.execute(text(statement))
+        print("✓ Battery search index created")
+        return True
+    except OperationalError as e:
+        print(f"Full-text search unavailable, falling back to LIKE search: {e}")
+        return False
+
+def battery_fts_available():
+    """Whether the FTS5 index exists, checked once per process on first search"""
+    global _battery_fts_available
+    if _battery_fts_available is None:
+        from sqlalchemy import text
+        
+        _battery_fts_available = db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'battery_fts'"
+        )).first() is not None
+    return _battery_fts_available
+
+def battery_fts_query(query):
+    """Turn free text into an FTS5 query where every word is a prefix match"""
+    return ' '.join(f'"{token}"*' for token in re.findall(r'\w+', query))
+
+def search_batteries(query, limit=10):
+    """Find batteries matching free text, exact barcode first"""
+    if battery_fts_available():
+        from sqlalchemy import text
+        
+        # Exact barcode match (unique index) always ranks first
+        exact = Battery.query.filter_by(barcode=query).first() if query else None
+        batteries = [exact] if exact else []
+        
+        fts_query = battery_fts_query(query)
+        if fts_query:
+            ids = db.session.execute(text(
+                "SELECT rowid FROM battery_fts WHERE battery_fts MATCH :q ORDER BY rank LIMIT :limit"
+            ), {'q': fts_query, 'limit': limit + 1}).scalars().all()
+            ids = [battery_id for battery_id in ids if not exact or battery_id != exact.id]
+            if ids:
+                matches = {battery.id: battery for battery in Battery.query.filter(Battery.id.in_(ids)).all()}
+                batteries.extend(matches[battery_id] for battery_id in ids if battery_id in matches)
+        return batteries[:limit]
+    
+    return Battery.query.filter(
+        (Battery.barcode.contains(query)) |
+        (Battery.name.contains(query)) |
+        (Battery.model.contains(query))
+    ).limit(limit).all()
+
+def create_default_admin():
+    """Create the default admin user if there is none"""
+    if not User.query.filter_by(username='admin').first():
+        admin = User(
+            username='admin',
+            password=generate_password_hash('admin123'),
+            role='admin'
+        )
+        db.session.add(admin)
+        db.session.commit()
+        print("✓ Admin user created: username='admin', password='admin123'")
+
+# Schema migrations, applied in order by `flask --app app upgrade-db` and
+# recorded in schema_version. Every step must also be safe to run against
+# databases created before versioning, which already have part of the schema.
+def migrate_create_tables():
+    """Create missing tables and indexes"""
+    db.create_all()
+    # create_all() skips indexes on tables that already exist
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+def migrate_scrap_deduction():
+    """Add sale.scrap_deduction to databases created before scrap tracking"""
+    from sqlalchemy import inspect, text
+    
+    columns = [col['name'] for col in inspect(db.engine).get_columns('sale')]
+    if 'scrap_deduction' not in columns:
+        with db.engine.begin() as conn:
+            conn.execute(text("ALTER TABLE sale ADD COLUMN scrap_deduction FLOAT DEFAULT 0"))
+        print("✓ scrap_deduction column added successfully")
+
+def migrate_sale_lines():
+    """Expand Sale.items JSON into sale_line rows"""
+    migrated = backfill_sale_lines()
+    if migrated:
+        print(f"✓ Migrated line items of {migrated} sales into sale_line table")
+
+SCHEMA_MIGRATIONS = [
+    (1, 'Create tables and indexes', migrate_create_tables),
+    (2, 'Add sale.scrap_deduction', migrate_scrap_deduction),
+    (3, 'Backfill sale_line from sale.items', migrate_sale_lines),
+    (4, 'Seed invoice counters from existing invoices', seed_invoice_counters),
+    (5, 'Create battery full-text search index', setup_battery_search),
+    (6, 'Create default admin user', create_default_admin),
+]
+
+def schema_version():
+    """Highest migration applied to the database, 0 for an unversioned one"""
+    return db.session.query(db.func.max(SchemaVersion.version)).scalar() or 0
+
+def upgrade_database():
+    """Apply pending schema migrations in order and return their versions"""
+    SchemaVersion.__table__.create(db.engine, checkfirst=True)
+    current = schema_version()
+    
+    applied = []
+    for version, description, migrate in SCHEMA_MIGRATIONS:
+        if version <= current:
+            continue
+        print(f"Applying migration {version}: {description}")
+        migrate()
+        db.session.add(SchemaVersion(version=version, description=description))
+        db.session.commit()
+        applied.append(version)
+    return applied
+
+@app.cli.command('upgrade-db')
+def upgrade_db():
+    """Bring the database schema up to date"""
+    applied = upgrade_database()
+    latest = SCHEMA_MIGRATIONS[-1][0]
+    if applied:
+        click.echo(f'✓ Database upgraded to schema version {latest}')
+    else:
+        click.echo(f'Database schema is up to date (version {latest})')
+
+# Date helpers
+def shop_timezone():
+    """Timezone used for calendar days in reports"""
+    if app.config['TIMEZONE']:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(app.config['TIMEZONE'])
+    return None
+
+def local_now():
+    """Current naive datetime in the shop's timezone"""
+    tz = shop_timezone()
+    if tz is None:
+        return datetime.now()
+    return datetime.now(tz).replace(tzinfo=None)
+
+def local_day_range(start_day, end_day=None):
+    """Convert local calendar days into a half-open [start, end) range of naive UTC datetimes.
+    
+    Sale.created_at is stored in UTC, so filtering on this range keeps the
+    comparison on the raw column and lets SQLite use ix_sale_created_at.
+    """
+    end_day = end_day or start_day
+    tz = shop_timezone()
+    
+    def to_utc(day):
+        local_midnight = datetime.combine(day, datetime.min.time())
+        if tz is None:
+            aware = local_midnight.astimezone()
+        else:
+            aware = local_midnight.replace(tzinfo=tz)
+        return aware.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    return to_utc(start_day), to_utc(end_day + timedelta(days=1))
+
+@app.template_filter('localtime')
+def localtime(value):
+    """Convert a naive UTC datetime from the database to naive shop-local time for display"""
+    if value is None:
+        return None
+    tz = shop_timezone()
+    aware = value.replace(tzinfo=timezone.utc)
+    return (aware.astimezone(tz) if tz else aware.astimezone()).replace(tzinfo=None)
+
+def parse_date(value, default):
+    """Parse a YYYY-MM-DD query argument, falling back to default"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return default
+
+# Keyset pagination
+def keyset_page(query, column, after=None, before=None, descending=False, per_page=None):
+    """Fetch one page of query ordered by a unique indexed column.
+    
+    Pages are addressed by the column value of their neighbours (after/before)
+    instead of an OFFSET, so every page costs the same index range scan.
+    Returns (rows, prev_cursor, next_cursor); a cursor is None at either end.
+    """
+    per_page = per_page or app.config['PAGE_SIZE']
+    backwards = before is not None
+    fetch_descending = descending != backwards
+    cursor = before if backwards else after
+    
+    if cursor is not None:
+        query = query.filter(column < cursor if fetch_descending else column > cursor)
+    rows = query.order_by(column.desc() if fetch_descending else column.asc()).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+    
+    if not rows:
+        return rows, None, None
+    first, last = getattr(rows[0], column.key), getattr(rows[-1], column.key)
+    if backwards:
+        return rows, first if has_more else None, last
+    return rows, first if after is not None else None, last if has_more else None
+
+# Dashboard statistics cache (per process)
+_dashboard_cache = {'key': None, 'expires': 0, 'stats': None, 'hits': 0, 'misses': 0}
+
+def get_dashboard_stats():
+    """Return dashboard counters, computed with aggregate queries and cached for a short TTL"""
+    today = local_now().date()
+    now = time.monotonic()
+    if _dashboard_cache['key'] == today and _dashboard_cache['expires'] > now:
+        _dashboard_cache['hits'] += 1
+        return _dashboard_cache['stats']
+    _dashboard_cache['misses'] += 1
+    
+    total_batteries = Battery.query.count()
+    low_stock = Battery.query.filter(Battery.quantity < 5).count()
+    
+    day_start, day_end = local_day_range(today)
+    total_sales_today, today_revenue = db.session.query(
+        db.func.count(Sale.id), db.func.coalesce(db.func.sum(Sale.total), 0)
+    ).filter(Sale.created_at >= day_start, Sale.created_at < day_end).one()
+    
+    total_sales_all, total_revenue_all = db.session.query(
+        db.func.count(Sale.id), db.func.coalesce(db.func.sum(Sale.total), 0)
+    ).one()
+    
+    stats = {
+        'total_batteries': total_batteries,
+        'total_sales_today': total_sales_today,
+        'today_revenue': today_revenue,
+        'total_sales_all': total_sales_all,
+        'total_revenue_all': total_revenue_all,
+        'low_stock': low_stock
+    }
+    _dashboard_cache.update(key=today, expires=now + app.config['DASHBOARD_CACHE_TTL'], stats=stats)
+    return stats
+
+def invalidate_dashboard_stats():
+    """Drop cached dashboard counters after sales or inventory change"""
+    _dashboard_cache.update(key=None, expires=0, stats=None)
+
+# Barcode lookup cache (per process, LRU)
+def battery_record(battery):
+    """Serializable battery fields used by the billing screen"""
+    return {
+        'barcode': battery.barcode,
+        'name': battery.name,
+        'model': battery.model,
+        'company': battery.company,
+        'weight': battery.weight,
+        'selling_price': battery.selling_price,
+        'quantity': battery.quantity
+    }
+
+class BatteryCache:
+    """Bounded LRU cache of battery records keyed by barcode.
+    
+    Catalogue edits bump the shared 'battery' row in cache_generation; each
+    worker compares it at most every BATTERY_CACHE_CHECK_INTERVAL seconds and
+    drops its entries when another worker has changed the catalogue. Sales
+    don't bump it: stock changes with every checkout, so cached hits get their
+    quantity from one indexed query instead. Request threads share the cache,
+    so the lock guards the entries; queries run outside it.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.generation = None
+        self.checked_at = 0
+        self.clears = 0  # Bumped on every clear so loads started before it aren't cached
+        self.hits = 0
+        self.misses = 0
+    
+    def check_generation(self):
+        now = time.monotonic()
+        with self.lock:
+            if now - self.checked_at < app.config['BATTERY_CACHE_CHECK_INTERVAL']:
+                return
+        generation = db.session.query(CacheGeneration.value).filter_by(name='battery').scalar()
+        with self.lock:
+            if generation != self.generation:
+                self.entries.clear()
+                self.clears += 1
+                self.generation = generation
+            self.checked_at = now
+    
+    def get(self, barcode):
+        return self.get_many([barcode]).get(barcode)
+    
+    def get_many(self, barcodes):
+        """Return {barcode: record} for the barcodes that exist, loading misses with one IN query.
+        
+        Quantities of cached hits are read fresh, since billing doesn't invalidate the cache.
+        """
+        self.check_generation()
+        records = {}
+        missing = []
+        with self.lock:
+            clears = self.clears
+            for barcode in barcodes:
+                record = self.entries.get(barcode)
+                if record is not None:
+                    self.entries.move_to_end(barcode)
+                    self.hits += 1
+                    records[barcode] = record
+                elif barcode not in missing:
+                    self.misses += 1
+                    missing.append(barcode)
+        
+        if records:
+            stock = dict(db.session.query(Battery.barcode, Battery.quantity).filter(Battery.barcode.in_(list(records))))
+            records = {barcode: {**record, 'quantity': stock[barcode]}
+                       for barcode, record in records.items() if barcode in stock}
+        
+        if missing:
+            loaded = {battery.barcode: battery_record(battery)
+                      for battery in Battery.query.filter(Battery.barcode.in_(missing)).all()}
+            records.update(loaded)
+            with self.lock:
+                if self.clears == clears:
+                    self.entries.update(loaded)
+                    while len(self.entries) > app.config['BATTERY_CACHE_SIZE']:
+                        self.entries.popitem(last=False)
+        return records
+    
+    def discard(self, barcodes):
+        """Drop entries for these barcodes from this worker only"""
+        with self.lock:
+            for barcode in barcodes:
+                self.entries.pop(barcode, None)
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.clears += 1
+            self.checked_at = 0
+    
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'max_size': app.config['BATTERY_CACHE_SIZE'],
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0,
+                'generation': self.generation
+            }
+
+battery_cache = BatteryCache()
+
+def invalidate_battery_cache():
+    """Bump the shared battery generation in the current transaction and clear this worker's cache.
+    
+    For catalogue changes (add, edit, delete, import); billing only discards
+    the sold barcodes locally.
+    """
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+    
+    stmt = sqlite_insert(CacheGeneration).values(name='battery', value=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CacheGeneration.name],
+        set_={'value': CacheGeneration.value + 1}
+    )
+    db.session.execute(stmt)
+    battery_cache.clear()
+
+# Slow-query log (opt-in with SLOW_QUERY_THRESHOLD_MS)
+_slow_query_logger = None
+
+def slow_query_logger():
+    """Logger writing JSON lines to the rotating SLOW_QUERY_LOG file, created on first use"""
+    global _slow_query_logger
+    if _slow_query_logger is None:
+        import logging
+        from logging.handlers import RotatingFileHandler
+        
+        os.makedirs(os.path.dirname(app.config['SLOW_QUERY_LOG']), exist_ok=True)
+        handler = RotatingFileHandler(app.config['SLOW_QUERY_LOG'], maxBytes=app.config['SLOW_QUERY_LOG_BYTES'],
+                                      backupCount=app.config['SLOW_QUERY_LOG_BACKUPS'], encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger = logging.getLogger('battery_store.slow_queries')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.addHandler(handler)
+        _slow_query_logger = logger
+    return _slow_query_logger
+
+def explain_query_plan(dbapi_connection, statement, parameters):
+    """EXPLAIN QUERY PLAN details for a statement, or [] if SQLite can't explain it"""
+    if not re.match(r'\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b', statement, re.IGNORECASE):
+        return []
     try:
-        return json.loads(value)
-    except:
+        rows = dbapi_connection.execute('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    except sqlite3.Error:
         return []
+    return [row[-1] for row in rows]
+
+def full_table_scans(statement, plan):
+    """Watched tables that a plan walks from end to end.
+    
+    Plan details read "SCAN sale" (or "SCAN TABLE sale" before SQLite 3.36),
+    naming the alias instead when the statement gives one. A SCAN through an
+    index, as count(*) does, still reads every entry and is flagged too. The
+    one exception is an unfiltered walk in index or rowid order that a LIMIT
+    stops early, like the dashboard's five most recent sales.
+    """
+    aliases = {}
+    for table, alias in re.findall(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', statement, re.IGNORECASE):
+        aliases[table] = table
+        if alias:
+            aliases[alias] = table
+    bounded = (re.search(r'\bLIMIT\b', statement, re.IGNORECASE)
+               and not re.search(r'\bWHERE\b', statement, re.IGNORECASE)
+               and not any(detail.startswith('USE TEMP B-TREE') for detail in plan))
+    
+    tables = []
+    for detail in plan:
+        match = re.match(r'SCAN (?:TABLE )?(\w+)', detail)
+        if not match or bounded:
+            continue
+        table = aliases.get(match.group(1), match.group(1))
+        if table in app.config['SLOW_QUERY_SCAN_TABLES']:
+            tables.append(table)
+    return tables
+
+def log_slow_query(cursor, statement, parameters, executemany, elapsed):
+    """Record a slow statement with its parameters, route and query plan"""
+    if executemany:
+        batch_size = len(parameters)
+        parameters = parameters[0] if parameters else ()
+    plan = explain_query_plan(cursor.connection, statement, parameters)
+    scans = full_table_scans(statement, plan)
+    entry = {
+        'time': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+        'duration_ms': round(elapsed * 1000, 2),
+        'endpoint': request.endpoint if has_request_context() else None,
+        'path': request.full_path if has_request_context() else None,
+        'statement': ' '.join(statement.split()),
+        'parameters': parameters,
+        'plan': plan,
+        'full_scan': scans,
+    }
+    if executemany:
+        entry['executemany'] = batch_size
+    logger = slow_query_logger()
+    (logger.warning if scans else logger.info)(json.dumps(entry, default=str))
+
+# Request metrics (per process; each gunicorn worker reports its own counters)
+class RequestMetrics:
+    """Latency histograms, status counts and SQL totals per endpoint"""
+    
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.statuses = {}
+    
+    def observe(self, endpoint, method, status, seconds, sql_statements, sql_seconds):
+        with self.lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = {
+                    'buckets': [0] * (len(self.buckets) + 1), 'count': 0, 'sum': 0.0,
+                    'sql_statements': 0, 'sql_seconds': 0.0
+                }
+            stats['buckets'][bisect.bisect_left(self.buckets, seconds)] += 1
+            stats['count'] += 1
+            stats['sum'] += seconds
+            stats['sql_statements'] += sql_statements
+            stats['sql_seconds'] += sql_seconds
+            key = (endpoint, method, status)
+            self.statuses[key] = self.statuses.get(key, 0) + 1
+    
+    def snapshot(self):
+        with self.lock:
+            endpoints = {name: dict(stats, buckets=list(stats['buckets'])) for name, stats in self.endpoints.items()}
+            return endpoints, dict(self.statuses)
+
+request_metrics = RequestMetrics(app.config['METRICS_BUCKETS'])
+
+def on_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context.metrics_started = time.perf_counter()
+
+def on_cursor_executed(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context.metrics_started
+    if has_request_context() and 'sql_statements' in g:
+        g.sql_statements += 1
+        g.sql_seconds += elapsed
+    threshold = app.config['SLOW_QUERY_THRESHOLD_MS']
+    if threshold is not None and elapsed * 1000 >= threshold:
+        log_slow_query(cursor, statement, parameters, executemany, elapsed)
+
+@app.before_request
+def start_request_timer():
+    if app.config['METRICS_ENABLED']:
+        g.request_started = time.perf_counter()
+        g.sql_statements = 0
+        g.sql_seconds = 0.0
+
+@app.after_request
+def remember_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def record_request_metrics(error=None):
+    # Runs after streamed responses finish, so exports are timed in full
+    if 'request_started' not in g:
+        return
+    request_metrics.observe(
+        request.endpoint or 'unmatched', request.method,
+        500 if error is not None else g.get('response_status', 500),
+        time.perf_counter() - g.request_started, g.sql_statements, g.sql_seconds
+    )
+
+with app.app_context():
+    from sqlalchemy import event
+    event.listen(db.engine, 'before_cursor_execute', on_cursor_execute)
+    event.listen(db.engine, 'after_cursor_execute', on_cursor_executed)
+
+def prometheus_labels(**labels):
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels.items()) + '}'
+
+def prometheus_metrics():
+    """Render request, SQL and cache metrics in the Prometheus text format"""
+    endpoints, statuses = request_metrics.snapshot()
+    lines = [
+        '# HELP battery_store_request_duration_seconds Request latency by endpoint.',
+        '# TYPE battery_store_request_duration_seconds histogram',
+    ]
+    for endpoint, stats in sorted(endpoints.items()):
+        cumulative = 0
+        for bound, count in zip(request_metrics.buckets + ('+Inf',), stats['buckets']):
+            cumulative += count
+            lines.append(f'battery_store_request_duration_seconds_bucket{prometheus_labels(endpoint=endpoint, le=bound)} {cumulative}')
+        lines.append(f"battery_store_request_duration_seconds_sum{prometheus_labels(endpoint=endpoint)} {stats['sum']:.6f}")
+        lines.append(f"battery_store_request_duration_seconds_count{prometheus_labels(endpoint=endpoint)} {stats['count']}")
+    
+    lines += [
+        '# HELP battery_store_requests_total Requests by endpoint, method and status.',
+        '# TYPE battery_store_requests_total counter',
+    ]
+    for (endpoint, method, status), count in sorted(statuses.items()):
+        lines.append(f'battery_store_requests_total{prometheus_labels(endpoint=endpoint, method=method, status=status)} {count}')
+    
+    lines += [
+        '# HELP battery_store_sql_statements_total SQL statements executed by requests, by endpoint.',
+        '# TYPE battery_store_sql_statements_total counter',
+    ]
+    lines += [f"battery_store_sql_statements_total{prometheus_labels(endpoint=endpoint)} {stats['sql_statements']}"
+              for endpoint, stats in sorted(endpoints.items())]
+    lines += [
+        '# HELP battery_store_sql_seconds_total Time spent executing SQL in requests, by endpoint.',
+        '# TYPE battery_store_sql_seconds_total counter',
+    ]
+    lines += [f"battery_store_sql_seconds_total{prometheus_labels(endpoint=endpoint)} {stats['sql_seconds']:.6f}"
+              for endpoint, stats in sorted(endpoints.items())]
+    
+    caches = {
+        'battery': battery_cache.stats(),
+        'dashboard': _dashboard_cache,
+        'invoice_pdf': invoice_cache_counts,
+    }
+    for kind in ('hits', 'misses'):
+        lines += [
+            f'# HELP battery_store_cache_{kind}_total Cache {kind} in this worker.',
+            f'# TYPE battery_store_cache_{kind}_total counter',
+        ]
+        lines += [f'battery_store_cache_{kind}_total{prometheus_labels(cache=name)} {stats[kind]}'
+                  for name, stats in caches.items()]
+    lines += [
+        '# HELP battery_store_cache_hit_ratio Share of cache lookups that were hits.',
+        '# TYPE battery_store_cache_hit_ratio gauge',
+    ]
+    for name, stats in caches.items():
+        lookups = stats['hits'] + stats['misses']
+        lines.append(f"battery_store_cache_hit_ratio{prometheus_labels(cache=name)} {stats['hits'] / lookups if lookups else 0:.4f}")
+    return '\n'.join(lines) + '\n'
 
-# Initialize database
-init_database()
+# On-demand request profiler: admins add ?profile (or ?profile=tottime) to any page
+PROFILE_SORT_KEYS = ('cumulative', 'tottime', 'calls')
+
+def profile_current_request():
+    """Run the requested view under cProfile and return a plain-text breakdown instead of the page"""
+    import cProfile
+    import pstats
+    from flask import before_render_template, template_rendered
+    from sqlalchemy import event
+    
+    sort_key = request.args.get('profile') if request.args.get('profile') in PROFILE_SORT_KEYS else 'cumulative'
+    view = app.view_functions[request.endpoint]
+    
+    # SQL time comes from the engine hooks; SQL issued while a template
+    # renders (lazy loads) is subtracted from the Jinja time
+    g.sql_statements = 0
+    g.sql_seconds = 0.0
+    rendering = {'seconds': 0.0, 'templates': []}
+    def render_started(sender, template, context, **extra):
+        rendering['started'] = (time.perf_counter(), g.sql_seconds)
+    def render_finished(sender, template, context, **extra):
+        started, sql_before = rendering.pop('started')
+        rendering['seconds'] += time.perf_counter() - started - (g.sql_seconds - sql_before)
+        rendering['templates'].append(template.name)
+    
+    loaded = {}
+    def count_loaded(target, context):
+        name = type(target).__name__
+        loaded[name] = loaded.get(name, 0) + 1
+    
+    profiler = cProfile.Profile()
+    event.listen(db.Model, 'load', count_loaded, propagate=True)
+    started = time.perf_counter()
+    try:
+        with before_render_template.connected_to(render_started, app), template_rendered.connected_to(render_finished, app):
+            profiler.enable()
+            try:
+                response = app.make_response(view(**request.view_args))
+                response.get_data()  # Include streamed bodies such as exports
+            finally:
+                profiler.disable()
+    finally:
+        event.remove(db.Model, 'load', count_loaded)
+    total = time.perf_counter() - started
+    
+    report = io.StringIO()
+    report.write(f'{request.method} {request.full_path} -> {response.status}\n')
+    report.write(f'Total:    {total * 1000:9.1f} ms (under the profiler)\n')
+    report.write(f"SQL:      {g.sql_seconds * 1000:9.1f} ms in {g.sql_statements} statements\n")
+    report.write(f"Jinja:    {rendering['seconds'] * 1000:9.1f} ms rendering {', '.join(rendering['templates']) or 'no templates'}\n")
+    report.write(f"Python:   {max(total - g.sql_seconds - rendering['seconds'], 0) * 1000:9.1f} ms\n")
+    report.write(f"ORM objects loaded: {sum(loaded.values())}")
+    if loaded:
+        report.write(' (' + ', '.join(f'{name} {count}' for name, count in sorted(loaded.items())) + ')')
+    report.write(f"\n\nTop {app.config['PROFILER_TOP']} functions, sorted by {sort_key}:\n")
+    pstats.Stats(profiler, stream=report).strip_dirs().sort_stats(sort_key).print_stats(app.config['PROFILER_TOP'])
+    return Response(report.getvalue(), mimetype='text/plain')
+
+@app.before_request
+def profile_request():
+    """Profile the view when an admin adds ?profile; for anyone else the flag is ignored"""
+    if 'profile' not in request.args or request.endpoint not in app.view_functions or request.endpoint == 'static':
+        return None
+    if not current_user.is_authenticated or current_user.role != 'admin':
+        return None
+    return profile_current_request()
 
 # Routes
 @app.route('/')
@@ -234,37 +1071,15 @@ def logout():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    # Get statistics
-    total_batteries = Battery.query.count()
-    
-    # Get today's sales
-    today = datetime.now().date()
-    today_sales = Sale.query.filter(
-        db.func.date(Sale.created_at) == today
-    ).all()
-    
-    total_sales_today = len(today_sales)
-    today_revenue = sum(sale.total for sale in today_sales)
-    
-    # Get all-time totals
-    all_sales = Sale.query.all()
-    total_sales_all = len(all_sales)
-    total_revenue_all = sum(sale.total for sale in all_sales)
-    
-    # Get low stock items (quantity < 5)
-    low_stock = Battery.query.filter(Battery.quantity < 5).count()
+    # Get statistics (counts, revenue and low stock items with quantity < 5)
+    stats = get_dashboard_stats()
     
     # Get recent sales for dashboard
     recent_sales = Sale.query.order_by(Sale.id.desc()).limit(5).all()
     
     return render_template('dashboard.html',
-                         total_batteries=total_batteries,
-                         total_sales_today=total_sales_today,
-                         today_revenue=today_revenue,
-                         total_sales_all=total_sales_all,
-                         total_revenue_all=total_revenue_all,
-                         low_stock=low_stock,
-                         recent_sales=recent_sales)
+                         recent_sales=recent_sales,
+                         **stats)
 
 @app.route('/add_inventory', methods=['GET', 'POST'])
 @login_required
@@ -298,18 +1113,236 @@ def add_inventory():
         )
         
         db.session.add(battery)
+        invalidate_battery_cache()
         db.session.commit()
+        invalidate_dashboard_stats()
         
         flash('Battery added successfully!', 'success')
         return redirect(url_for('view_inventory'))
     
     return render_template('add_inventory.html')
 
+INVENTORY_IMPORT_COLUMNS = ['barcode', 'name', 'model', 'company', 'weight', 'purchase_price', 'selling_price', 'quantity']
+
+# Values for optional columns that are blank or missing when a CSV row is inserted;
+# updates leave those columns as they are
+INVENTORY_IMPORT_DEFAULTS = {'model': '', 'company': '', 'weight': 0}
+
+def parse_inventory_row(row):
+    """Validate one CSV row into battery column values, raising ValueError with a readable message.
+    
+    Blank or missing model, company and weight come back as None.
+    """
+    barcode = (row.get('barcode') or '').strip()
+    name = (row.get('name') or '').strip()
+    if not barcode:
+        raise ValueError('Barcode is required')
+    if not name:
+        raise ValueError('Name is required')
+    
+    def number(field, cast, required=False, default=0):
+        value = (row.get(field) or '').strip()
+        if not value:
+            if required:
+                raise ValueError(f'{field} is required')
+            return default
+        try:
+            return cast(value)
+        except ValueError:
+            raise ValueError(f'Invalid {field}: {value}')
+    
+    return {
+        'barcode': barcode,
+        'name': name,
+        'model': (row.get('model') or '').strip() or None,
+        'company': (row.get('company') or '').strip() or None,
+        'weight': number('weight', float, default=None),
+        'purchase_price': number('purchase_price', float, required=True),
+        'selling_price': number('selling_price', float, required=True),
+        'quantity': number('quantity', int)
+    }
+
+def import_inventory_rows(reader, update_existing=False):
+    """Insert new batteries and optionally update existing ones from CSV rows in batched executemany transactions.
+    
+    Existing rows get their details replaced and the CSV quantity added to
+    stock; optional columns that are blank or not in the file keep their
+    stored values. Returns a report with inserted/updated counts and per-row errors.
+    If the CSV can't be parsed to the end, `stopped` is the last line read and
+    `committed_line` the last line whose batch was saved (None if none was);
+    rows after it are not imported.
+    """
+    from sqlalchemy import bindparam, select
+    
+    battery_table = Battery.__table__
+    update_stmt = battery_table.update().where(
+        battery_table.c.barcode == bindparam('b_barcode')
+    ).values(
+        name=bindparam('b_name'),
+        model=db.func.coalesce(bindparam('b_model'), battery_table.c.model),
+        company=db.func.coalesce(bindparam('b_company'), battery_table.c.company),
+        weight=db.func.coalesce(bindparam('b_weight'), battery_table.c.weight),
+        purchase_price=bindparam('b_purchase_price'),
+        selling_price=bindparam('b_selling_price'),
+        quantity=battery_table.c.quantity + bindparam('b_quantity')
+    )
+    
+    existing = set(db.session.scalars(select(Battery.barcode)))
+    seen = set()
+    inserts, updates, errors = [], [], []
+    report = {'inserted': 0, 'updated': 0, 'errors': errors, 'stopped': None, 'committed_line': None}
+    
+    def flush(line_number):
+        if inserts:
+            db.session.execute(battery_table.insert(), inserts)
+        if updates:
+            db.session.execute(update_stmt, [{f'b_{key}': value for key, value in record.items()} for record in updates])
+        invalidate_battery_cache()
+        db.session.commit()
+        report['inserted'] += len(inserts)
+        report['updated'] += len(updates)
+        report['committed_line'] = line_number
+    
+    rows = iter(reader)
+    line_number = 1
+    while True:
+        try:
+            row = next(rows)
+        except StopIteration:
+            break
+        except csv.Error as e:
+            # Keep the batches already saved and drop the unsaved one
+            report['stopped'] = reader.line_num
+            errors.append({'line': reader.line_num + 1, 'barcode': '', 'error': f'Could not read CSV: {e}'})
+            return report
+        line_number = reader.line_num
+        
+        try:
+            record = parse_inventory_row(row)
+        except ValueError as e:
+            errors.append({'line': line_number, 'barcode': row.get('barcode', ''), 'error': str(e)})
+            continue
+        
+        if record['barcode'] in seen:
+            errors.append({'line': line_number, 'barcode': record['barcode'], 'error': 'Duplicate barcode in file'})
+            continue
+        seen.add(record['barcode'])
+        
+        if record['barcode'] in existing:
+            if not update_existing:
+                errors.append({'line': line_number, 'barcode': record['barcode'], 'error': 'Barcode already exists'})
+                continue
+            updates.append(record)
+        else:
+            inserts.append({key: INVENTORY_IMPORT_DEFAULTS[key] if value is None else value
+                            for key, value in record.items()})
+        
+        if len(inserts) + len(updates) >= app.config['IMPORT_BATCH_SIZE']:
+            flush(line_number)
+            inserts, updates = [], []
+    
+    if inserts or updates:
+        flush(line_number)
+    return report
+
+def decode_csv_upload(data):
+    """Decode an uploaded CSV, UTF-16 if it has a UTF-16 BOM and UTF-8 otherwise.
+    
+    Raises ValueError naming the first line that doesn't decode.
+    """
+    encoding = 'utf-16' if data[:2] in (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE) else 'utf-8-sig'
+    try:
+        return data.decode(encoding)
+    except UnicodeDecodeError as e:
+        line = data[:e.start].decode(encoding, errors='replace').count('\n') + 1
+        raise ValueError(f'line {line} is not valid {"UTF-16" if encoding == "utf-16" else "UTF-8"} text. '
+                         'Save the file as "CSV UTF-8" and try again.')
+
+@app.route('/import_inventory', methods=['GET', 'POST'])
+@login_required
+def import_inventory():
+    result = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Please choose a CSV file to import!', 'danger')
+            return redirect(url_for('import_inventory'))
+        
+        # Decode the whole file and read the header before anything is saved
+        try:
+            reader = csv.DictReader(io.StringIO(decode_csv_upload(upload.read()), newline=''))
+            fieldnames = reader.fieldnames or []
+        except (ValueError, csv.Error) as e:
+            flash(f'Could not read CSV file: {e}', 'danger')
+            return redirect(url_for('import_inventory'))
+        missing = [column for column in ('barcode', 'name', 'purchase_price', 'selling_price')
+                   if column not in fieldnames]
+        if missing:
+            flash(f'CSV is missing required columns: {", ".join(missing)}', 'danger')
+            return redirect(url_for('import_inventory'))
+        
+        result = import_inventory_rows(reader, update_existing=bool(request.form.get('update_existing')))
+        invalidate_dashboard_stats()
+        
+        if result['stopped']:
+            saved = (f"Lines up to {result['committed_line']} were saved" if result['committed_line']
+                     else 'Nothing was saved')
+            flash(f"Import stopped after line {result['stopped']} because the next record could not be read. "
+                  f"{saved} ({result['inserted']} added, {result['updated']} updated); "
+                  f"nothing after that was imported.", 'danger')
+        else:
+            flash(f"Import finished: {result['inserted']} added, {result['updated']} updated, "
+                  f"{len(result['errors'])} rejected.", 'success' if not result['errors'] else 'warning')
+    
+    return render_template('import_inventory.html', result=result, columns=INVENTORY_IMPORT_COLUMNS)
+
 @app.route('/view_inventory')
 @login_required
 def view_inventory():
-    batteries = Battery.query.all()
-    return render_template('view_inventory.html', batteries=batteries)
+    filters = {
+        'company': request.args.get('company', '').strip(),
+        'model': request.args.get('model', '').strip(),
+        'stock': request.args.get('stock', '')
+    }
+    
+    query = Battery.query
+    if filters['company']:
+        query = query.filter(Battery.company == filters['company'])
+    if filters['model']:
+        query = query.filter(Battery.model.startswith(filters['model']))
+    if filters['stock'] == 'in':
+        query = query.filter(Battery.quantity > 0)
+    elif filters['stock'] == 'low':
+        query = query.filter(Battery.quantity < 5)
+    elif filters['stock'] == 'out':
+        query = query.filter(Battery.quantity <= 0)
+    
+    batteries, prev_cursor, next_cursor = keyset_page(
+        query, Battery.id,
+        after=request.args.get('after', type=int),
+        before=request.args.get('before', type=int)
+    )
+    
+    # Footer totals for the whole filtered set
+    total_count, total_units, stock_value = query.with_entities(
+        db.func.count(Battery.id),
+        db.func.coalesce(db.func.sum(Battery.quantity), 0),
+        db.func.coalesce(db.func.sum(Battery.quantity * Battery.purchase_price), 0)
+    ).one()
+    
+    companies = [row[0] for row in db.session.query(Battery.company).filter(
+        Battery.company.isnot(None), Battery.company != ''
+    ).distinct().order_by(Battery.company).all()]
+    
+    return render_template('view_inventory.html',
+                         batteries=batteries,
+                         filters=filters,
+                         companies=companies,
+                         prev_cursor=prev_cursor,
+                         next_cursor=next_cursor,
+                         total_count=total_count,
+                         total_units=total_units,
+                         stock_value=stock_value)
 
 @app.route('/edit_inventory/<int:id>', methods=['GET', 'POST'])
 @login_required
@@ -326,7 +1359,9 @@ def edit_inventory(id):
         battery.quantity = int(request.form.get('quantity', 0))
         battery.updated_at = datetime.utcnow()
         
+        invalidate_battery_cache()
         db.session.commit()
+        invalidate_dashboard_stats()
         flash('Battery updated successfully!', 'success')
         return redirect(url_for('view_inventory'))
     
@@ -338,28 +1373,39 @@ def edit_inventory(id):
 def delete_inventory(id):
     battery = Battery.query.get_or_404(id)
     db.session.delete(battery)
+    invalidate_battery_cache()
     db.session.commit()
+    invalidate_dashboard_stats()
     flash('Battery deleted successfully!', 'success')
     return redirect(url_for('view_inventory'))
 
 @app.route('/get_battery_info/<barcode>')
 @login_required
 def get_battery_info(barcode):
-    battery = Battery.query.filter_by(barcode=barcode).first()
-    if battery:
+    record = battery_cache.get(barcode)
+    if record:
         return jsonify({
             'success': True,
-            'data': {
-                'name': battery.name,
-                'model': battery.model,
-                'company': battery.company,
-                'weight': battery.weight,
-                'selling_price': battery.selling_price,
-                'quantity': battery.quantity
-            }
+            'data': record
         })
     return jsonify({'success': False})
 
+@app.route('/cache_stats')
+@login_required
+@admin_required
+def cache_stats():
+    return jsonify({
+        'battery': battery_cache.stats(),
+        'dashboard': {'hits': _dashboard_cache['hits'], 'misses': _dashboard_cache['misses']},
+        'invoice_pdf': invoice_cache_counts
+    })
+
+@app.route('/metrics')
+@login_required
+@admin_required
+def metrics():
+    return Response(prometheus_metrics(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/billing', methods=['GET', 'POST'])
 @login_required
 def billing():
@@ -377,17 +1423,24 @@ def billing():
             subtotal = sum(item['total'] for item in items)
             total = subtotal - discount - scrap_deduction
             
-            # Generate invoice number
-            today = datetime.now().strftime('%Y%m%d')
-            last_invoice = Sale.query.filter(
-                Sale.invoice_number.like(f'INV-{today}-%')
-            ).order_by(Sale.id.desc()).first()
+            # Take the write lock before reading stock so concurrent checkouts can't oversell
+            begin_immediate()
             
-            if last_invoice:
-                last_num = int(last_invoice.invoice_number.split('-')[-1])
-                invoice_number = f'INV-{today}-{last_num + 1:04d}'
-            else:
-                invoice_number = f'INV-{today}-0001'
+            # Total requested quantity per barcode
+            requested = {}
+            for item in items:
+                requested[item['barcode']] = requested.get(item['barcode'], 0) + int(item['quantity'])
+            
+            # Check stock for the whole cart with one query
+            batteries = Battery.query.filter(Battery.barcode.in_(list(requested))).all()
+            for battery in batteries:
+                if battery.quantity < requested[battery.barcode]:
+                    db.session.rollback()
+                    flash(f'Not enough stock for {battery.name}. Available: {battery.quantity}, Requested: {requested[battery.barcode]}', 'danger')
+                    return redirect(url_for('billing'))
+            
+            # Generate invoice number
+            invoice_number = next_invoice_number(local_now().strftime('%Y%m%d'))
             
             # Create sale record
             sale = Sale(
@@ -402,17 +1455,18 @@ def billing():
                 payment_method=payment_method,
                 created_by=current_user.username
             )
+            sale.lines = [SaleLine(**row) for row in sale_line_rows(None, items)]
             
             db.session.add(sale)
             
-            # Update inventory quantities
-            for item in items:
-                battery = Battery.query.filter_by(barcode=item['barcode']).first()
-                if battery and battery.quantity >= item['quantity']:
-                    battery.quantity -= item['quantity']
-                elif battery:
-                    flash(f'Not enough stock for {battery.name}. Available: {battery.quantity}, Requested: {item["quantity"]}', 'danger')
-                    return redirect(url_for('billing'))
+            # Update inventory quantities (items not in inventory are sold without a stock change)
+            in_stock = {battery.barcode: requested[battery.barcode] for battery in batteries}
+            if in_stock:
+                if decrement_stock(in_stock) != len(in_stock):
+                    raise RuntimeError('Stock changed while the bill was being processed')
+                # Only stock changed, which cached lookups read live, so the
+                # other workers' caches stay warm
+                battery_cache.discard(in_stock)
             
             # Add scrap items to scrap inventory
             for scrap in scrap_items:
@@ -428,6 +1482,7 @@ def billing():
                 db.session.add(scrap_item)
             
             db.session.commit()
+            invalidate_dashboard_stats()
             
             flash(f'Bill created successfully! Invoice: {invoice_number}', 'success')
             return redirect(url_for('invoice', invoice_number=invoice_number))
@@ -443,86 +1498,47 @@ def billing():
 @login_required
 def invoice(invoice_number):
     sale = Sale.query.filter_by(invoice_number=invoice_number).first_or_404()
-    items = json.loads(sale.items)
+    items = sale.lines
     
     # Get scrap items for this invoice
     scrap_items = ScrapInventory.query.filter_by(sold_invoice=invoice_number).all()
     
     return render_template('invoice.html', sale=sale, items=items, scrap_items=scrap_items)
 
-@app.route('/print_invoice/<invoice_number>/<size>')
-@login_required
-def print_invoice(invoice_number, size):
-    sale = Sale.query.filter_by(invoice_number=invoice_number).first_or_404()
-    items = json.loads(sale.items)
-    scrap_items = ScrapInventory.query.filter_by(sold_invoice=invoice_number).all()
-    
-    # Create PDF
-    if size == 'a4':
-        pagesize = A4
-    else:  # thermal
-        pagesize = (200, 300)  # Thermal printer size
+def render_invoice_pdf(sale, items, scrap_items, size):
+    """Render an invoice as PDF bytes in 'a4' or 'thermal' layout"""
+    # ReportLab is imported here so workers don't pay for it at boot
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib import colors
+    from reportlab.pdfgen import canvas
     
     buffer = io.BytesIO()
     
     if size == 'thermal':
-        # Simple thermal printer format
-        c = canvas.Canvas(buffer, pagesize=pagesize)
-        width, height = pagesize
-        
-        # Shop info
-        c.setFont("Helvetica", 10)
-        c.drawString(10, height - 20, app.config['SHOP_NAME'])
-        c.drawString(10, height - 35, app.config['SHOP_ADDRESS'])
-        c.drawString(10, height - 50, f"Salesman: {app.config['SALESMAN_NAME']}")
-        c.drawString(10, height - 65, f"Phone: {app.config['PHONE_NUMBER']}")
-        
-        c.drawString(10, height - 85, "=" * 40)
+        # Receipt roll: as wide as THERMAL_LINE_WIDTH characters, as long as its content
+        chars = app.config['THERMAL_LINE_WIDTH']
+        lines = thermal_receipt_lines(sale, items, scrap_items, chars)
+        fonts = {'title': ('Courier-Bold', 12, 16), 'bold': ('Courier-Bold', 8, 11)}
+        width = chars * 4.8 + 20  # Courier glyphs are 0.6 em wide
+        height = 30 + sum(fonts.get(style, ('Courier', 8, 11))[2] for style, _ in lines)
+        c = canvas.Canvas(buffer, pagesize=(width, height))
         
-        # Invoice details
-        c.drawString(10, height - 105, f"Invoice: {sale.invoice_number}")
-        c.drawString(10, height - 120, f"Date: {sale.created_at.strftime('%Y-%m-%d %H:%M')}")
-        c.drawString(10, height - 135, f"Customer: {sale.customer_name}")
-        
-        c.drawString(10, height - 155, "=" * 40)
-        
-        # Items
-        y = height - 175
-        for item in items:
-            c.drawString(10, y, f"{item['name'][:20]}")
-            c.drawString(10, y - 15, f"  Qty: {item['quantity']} @ {item['price']} = {item['total']}")
-            y -= 30
-        
-        # Scrap items
-        if scrap_items:
-            c.drawString(10, y - 10, "-" * 40)
-            y -= 20
-            c.drawString(10, y, "Scrap Items:")
-            y -= 15
-            for scrap in scrap_items:
-                c.drawString(10, y, f"{scrap.name[:20]}")
-                c.drawString(10, y - 15, f"  Price: -{scrap.price}")
-                y -= 30
-        
-        c.drawString(10, y - 10, "=" * 40)
-        
-        # Totals
-        c.drawString(10, y - 30, f"Subtotal: {sale.subtotal:.2f}")
-        c.drawString(10, y - 45, f"Discount: {sale.discount:.2f}")
-        if sale.scrap_deduction > 0:
-            c.drawString(10, y - 60, f"Scrap Deduction: {sale.scrap_deduction:.2f}")
-            c.drawString(10, y - 75, f"Total: {sale.total:.2f}")
-            c.drawString(10, y - 90, f"Payment: {sale.payment_method}")
-        else:
-            c.drawString(10, y - 60, f"Total: {sale.total:.2f}")
-            c.drawString(10, y - 75, f"Payment: {sale.payment_method}")
-        
-        c.drawString(10, y - 110, "Thank you for your business!")
+        y = height - 15
+        for style, text in lines:
+            font, font_size, leading = fonts.get(style, ('Courier', 8, 11))
+            y -= leading
+            c.setFont(font, font_size)
+            if style in ('title', 'center'):
+                c.drawCentredString(width / 2, y, text)
+            else:
+                c.drawString(10, y, text)
         
         c.save()
     else:
         # A4 format with ReportLab
-        doc = SimpleDocTemplate(buffer, pagesize=pagesize)
+        doc = SimpleDocTemplate(buffer, pagesize=A4)
         elements = []
         styles = getSampleStyleSheet()
         
@@ -541,7 +1557,7 @@ def print_invoice(invoice_number, size):
         invoice_info = f"""
         <para>
         <b>Invoice Number:</b> {sale.invoice_number}<br/>
-        <b>Date:</b> {sale.created_at.strftime('%Y-%m-%d %H:%M')}<br/>
+        <b>Date:</b> {localtime(sale.created_at).strftime('%Y-%m-%d %H:%M')}<br/>
         <b>Customer:</b> {sale.customer_name}<br/>
         <b>Phone:</b> {sale.customer_phone}
         </para>
@@ -553,10 +1569,10 @@ def print_invoice(invoice_number, size):
         table_data = [['Item', 'Qty', 'Price', 'Total']]
         for item in items:
             table_data.append([
-                f"{item['name']}\n{item.get('model', '')}",
-                item['quantity'],
-                f"Rs. {item['price']:.2f}",
-                f"Rs. {item['total']:.2f}"
+                f"{item.name}\n{item.model or ''}",
+                item.quantity,
+                f"Rs. {item.price:.2f}",
+                f"Rs. {item.total:.2f}"
             ])
         
         # Add scrap items if any
@@ -608,76 +1624,687 @@ def print_invoice(invoice_number, size):
         
         doc.build(elements)
     
-    buffer.seek(0)
-    return send_file(buffer, as_attachment=True, download_name=f'invoice_{invoice_number}.pdf', mimetype='application/pdf')
+    return buffer.getvalue()
 
-@app.route('/daily_report')
+# Rendered invoice PDF cache (on disk, shared by all workers)
+invoice_cache_counts = {'hits': 0, 'misses': 0}  # Lookups by print_invoice in this worker
+_invoice_cache_usage = {'bytes': 0, 'scanned_at': None}  # This worker's running estimate of the cache size
+
+def invoice_cache_path(invoice_number, size):
+    """Cache file for an invoice layout; the key includes the template version, shop details and thermal line width"""
+    shop = '|'.join(str(app.config[key]) for key in ('SHOP_NAME', 'SHOP_ADDRESS', 'SALESMAN_NAME', 'PHONE_NUMBER'))
+    shop_hash = hashlib.sha1(shop.encode('utf-8')).hexdigest()[:8]
+    layout = f"thermal{app.config['THERMAL_LINE_WIDTH']}" if size == 'thermal' else size
+    filename = secure_filename(f"{invoice_number}_{layout}_v{app.config['INVOICE_TEMPLATE_VERSION']}_{shop_hash}.pdf")
+    return os.path.join(app.config['INVOICE_CACHE_DIR'], filename)
+
+def store_cached_invoice(path, pdf, evict=True):
+    """Atomically write a rendered PDF into the cache, then evict least recently used files over the size limit"""
+    cache_dir = os.path.dirname(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(pdf)
+    os.replace(tmp_path, path)
+    _invoice_cache_usage['bytes'] += len(pdf)
+    if evict:
+        evict_invoice_cache(keep=path)
+
+def evict_invoice_cache(keep=None):
+    """Delete least recently used cached PDFs until the cache fits INVOICE_CACHE_MAX_BYTES.
+    
+    The directory is only scanned when this worker's running total says the
+    cache may be over budget, or when that total is older than
+    INVOICE_CACHE_SCAN_INTERVAL, since other workers write to the same cache.
+    """
+    now = time.monotonic()
+    scanned_at = _invoice_cache_usage['scanned_at']
+    if (scanned_at is not None and now - scanned_at < app.config['INVOICE_CACHE_SCAN_INTERVAL']
+            and _invoice_cache_usage['bytes'] <= app.config['INVOICE_CACHE_MAX_BYTES']):
+        return
+    _invoice_cache_usage['scanned_at'] = now
+    
+    cache_dir = app.config['INVOICE_CACHE_DIR']
+    if not os.path.isdir(cache_dir):
+        _invoice_cache_usage['bytes'] = 0
+        return
+    
+    entries = []
+    total_size = 0
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and entry.name.endswith('.pdf'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size += stat.st_size
+    
+    if total_size <= app.config['INVOICE_CACHE_MAX_BYTES']:
+        _invoice_cache_usage['bytes'] = total_size
+        return
+    
+    # Cache hits refresh mtime, so the oldest mtime is the least recently used.
+    # Trim to 90% of the budget so the next few writes don't trigger another scan.
+    target_size = app.config['INVOICE_CACHE_MAX_BYTES'] * 9 // 10
+    for mtime, file_size, entry_path in sorted(entries):
+        if total_size <= target_size:
+            break
+        if entry_path == keep:
+            continue
+        try:
+            os.remove(entry_path)
+            total_size -= file_size
+        except FileNotFoundError:
+            pass
+    _invoice_cache_usage['bytes'] = total_size
+
+def invalidate_cached_invoices(invoice_number):
+    """Remove every cached layout of an invoice"""
+    cache_dir = app.config['INVOICE_CACHE_DIR']
+    prefix = secure_filename(f'{invoice_number}_')
+    if not os.path.isdir(cache_dir):
+        return
+    for entry in os.scandir(cache_dir):
+        if entry.name.startswith(prefix):
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+@app.route('/print_invoice/<invoice_number>/<size>')
 @login_required
-def daily_report():
-    date_str = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
+def print_invoice(invoice_number, size):
+    if size not in ('a4', 'thermal'):
+        abort(404)
+    sale = Sale.query.filter_by(invoice_number=invoice_number).first_or_404()
+    download_name = f'invoice_{invoice_number}.pdf'
+    
+    # Sales never change once written, so reprints are served from the cache
+    cache_path = invoice_cache_path(sale.invoice_number, size)
+    try:
+        os.utime(cache_path)
+        invoice_cache_counts['hits'] += 1
+        return send_file(cache_path, as_attachment=True, download_name=download_name, mimetype='application/pdf')
+    except FileNotFoundError:
+        invoice_cache_counts['misses'] += 1
+    
+    items = sale.lines
+    scrap_items = ScrapInventory.query.filter_by(sold_invoice=invoice_number).all()
+    pdf = render_invoice_pdf(sale, items, scrap_items, size)
+    store_cached_invoice(cache_path, pdf)
+    
+    return send_file(io.BytesIO(pdf), as_attachment=True, download_name=download_name, mimetype='application/pdf')
+
+# Background PDF jobs
+# A job id is the invoice's cache file name, so any gunicorn worker can report
+# its status from INVOICE_CACHE_DIR: <id>.pdf when done, <id>.pending while
+# rendering and <id>.error if rendering failed.
+_pdf_executor = None
+
+def process_pool_context():
+    """Start method for PDF process pools.
+    
+    Request threads may hold locks when a pool starts a process, so pools
+    start workers from a clean forkserver (or spawn) instead of forking
+    this worker. Pool processes import app once and are then reused.
+    """
+    import multiprocessing
+    
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+def get_pdf_executor():
+    """Create this worker's background PDF pool on first use"""
+    global _pdf_executor
+    if _pdf_executor is None:
+        workers = app.config['PDF_JOB_WORKERS']
+        if app.config['PDF_JOB_EXECUTOR'] == 'process':
+            from concurrent.futures import ProcessPoolExecutor
+            
+            _pdf_executor = ProcessPoolExecutor(max_workers=workers, mp_context=process_pool_context())
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+            
+            _pdf_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pdf-job')
+    return _pdf_executor
+
+def pdf_job_path(job_id, suffix):
+    """File for a job id in the invoice cache, or None if the id is not a plain file name"""
+    if not job_id or secure_filename(job_id) != job_id:
+        return None
+    return os.path.join(app.config['INVOICE_CACHE_DIR'], job_id + suffix)
+
+def render_invoice_to_cache(job, size, path):
+    """Background job entry point: render an invoice from invoice_render_data() into the cache"""
+    sale, items, scrap_items = job
     try:
-        report_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-    except ValueError:
-        report_date = datetime.now().date()
+        store_cached_invoice(path, render_invoice_pdf(sale, items, scrap_items, size))
+    except Exception as e:
+        with open(path[:-len('.pdf')] + '.error', 'w', encoding='utf-8') as f:
+            f.write(str(e))
+    finally:
+        try:
+            os.remove(path[:-len('.pdf')] + '.pending')
+        except FileNotFoundError:
+            pass
+
+def pdf_job_status(job_id):
+    """Status payload for a job id, or None if the job is unknown"""
+    if pdf_job_path(job_id, '.pdf') is None:
+        return None
+    status = {'job_id': job_id, 'status_url': url_for('pdf_job', job_id=job_id)}
+    if os.path.exists(pdf_job_path(job_id, '.pdf')):
+        status.update(status='done', download_url=url_for('download_pdf_job', job_id=job_id))
+    elif os.path.exists(pdf_job_path(job_id, '.error')):
+        with open(pdf_job_path(job_id, '.error'), encoding='utf-8') as f:
+            status.update(status='failed', error=f.read())
+    elif os.path.exists(pdf_job_path(job_id, '.pending')):
+        # A worker that died mid-job leaves its marker behind
+        age = time.time() - os.path.getmtime(pdf_job_path(job_id, '.pending'))
+        if age > app.config['PDF_JOB_TIMEOUT']:
+            status.update(status='failed', error='Rendering timed out')
+        else:
+            status.update(status='pending')
+    else:
+        return None
+    return status
+
+@app.route('/print_invoice/<invoice_number>/<size>/async', methods=['POST'])
+@login_required
+def print_invoice_async(invoice_number, size):
+    """Queue PDF rendering on the background pool and return a job id immediately"""
+    if size not in ('a4', 'thermal'):
+        abort(404)
+    sale = Sale.query.filter_by(invoice_number=invoice_number).first_or_404()
+    cache_path = invoice_cache_path(sale.invoice_number, size)
+    job_id = os.path.basename(cache_path)[:-len('.pdf')]
+    
+    status = pdf_job_status(job_id)
+    if status is None or status['status'] == 'failed':
+        for suffix in ('.error', '.pending'):
+            try:
+                os.remove(pdf_job_path(job_id, suffix))
+            except FileNotFoundError:
+                pass
+        os.makedirs(app.config['INVOICE_CACHE_DIR'], exist_ok=True)
+        open(pdf_job_path(job_id, '.pending'), 'w').close()
+        
+        scrap_items = ScrapInventory.query.filter_by(sold_invoice=invoice_number).all()
+        job = invoice_render_data(sale, sale.lines, scrap_items)
+        get_pdf_executor().submit(render_invoice_to_cache, job, size, cache_path)
+        status = pdf_job_status(job_id)
     
+    return jsonify(status), 202 if status['status'] == 'pending' else 200
+
+@app.route('/pdf_jobs/<job_id>')
+@login_required
+def pdf_job(job_id):
+    status = pdf_job_status(job_id)
+    if status is None:
+        return jsonify({'job_id': job_id, 'status': 'unknown'}), 404
+    return jsonify(status)
+
+@app.route('/pdf_jobs/<job_id>/download')
+@login_required
+def download_pdf_job(job_id):
+    path = pdf_job_path(job_id, '.pdf')
+    if path is None or not os.path.exists(path):
+        abort(404)
+    os.utime(path)
+    invoice_number = job_id.split('_')[0]
+    return send_file(path, as_attachment=True, download_name=f'invoice_{invoice_number}.pdf', mimetype='application/pdf')
+
+# ESC/POS thermal receipts
+ESC_INIT = b'\x1b@'
+ESC_ALIGN_LEFT = b'\x1ba\x00'
+ESC_ALIGN_CENTER = b'\x1ba\x01'
+ESC_BOLD_ON = b'\x1bE\x01'
+ESC_BOLD_OFF = b'\x1bE\x00'
+ESC_DOUBLE_SIZE = b'\x1d!\x11'
+ESC_NORMAL_SIZE = b'\x1d!\x00'
+ESC_FEED_AND_CUT = b'\x1bd\x04\x1dVB\x00'
+
+def thermal_receipt_lines(sale, items, scrap_items, width):
+    """Receipt text for a roll `width` characters wide, as (style, text) lines.
+    
+    Style is 'title', 'center', 'bold' or None; both the ESC/POS receipt and
+    the thermal PDF are drawn from these lines.
+    """
+    lines = []
+    
+    def columns(left, right, style=None):
+        lines.append((style, f"{left[:width - len(right) - 1]:<{width - len(right)}}{right}"))
+    
+    # Shop info
+    for part in textwrap.wrap(app.config['SHOP_NAME'], width // 2) or ['']:
+        lines.append(('title', part))
+    for part in textwrap.wrap(app.config['SHOP_ADDRESS'], width):
+        lines.append(('center', part))
+    lines.append(('center', f"Salesman: {app.config['SALESMAN_NAME']}"))
+    lines.append(('center', f"Phone: {app.config['PHONE_NUMBER']}"))
+    lines.append((None, '=' * width))
+    
+    # Invoice details
+    lines.append((None, f"Invoice: {sale.invoice_number}"))
+    lines.append((None, f"Date: {localtime(sale.created_at).strftime('%Y-%m-%d %H:%M')}"))
+    lines.append((None, f"Customer: {sale.customer_name}"))
+    lines.append((None, '=' * width))
+    
+    # Items
+    for item in items:
+        for part in textwrap.wrap(item.name or '', width) or ['']:
+            lines.append((None, part))
+        columns(f"  {item.quantity} x {item.price:.2f}", f"{item.total:.2f}")
+    
+    # Scrap items
+    if scrap_items:
+        lines.append((None, '-' * width))
+        lines.append((None, 'Scrap Items:'))
+        for scrap in scrap_items:
+            for part in textwrap.wrap(scrap.name or '', width) or ['']:
+                lines.append((None, part))
+            columns('', f"-{scrap.price:.2f}")
+    lines.append((None, '=' * width))
+    
+    # Totals
+    columns('Subtotal:', f"{sale.subtotal:.2f}")
+    columns('Discount:', f"-{sale.discount:.2f}")
+    if sale.scrap_deduction > 0:
+        columns('Scrap Deduction:', f"-{sale.scrap_deduction:.2f}")
+    columns('Total:', f"{sale.total:.2f}", 'bold')
+    columns('Payment:', (sale.payment_method or '').upper())
+    lines.append((None, ''))
+    lines.append(('center', 'Thank you for your business!'))
+    return lines
+
+ESC_STYLES = {
+    'title': (ESC_ALIGN_CENTER + ESC_BOLD_ON + ESC_DOUBLE_SIZE, ESC_NORMAL_SIZE + ESC_BOLD_OFF + ESC_ALIGN_LEFT),
+    'center': (ESC_ALIGN_CENTER, ESC_ALIGN_LEFT),
+    'bold': (ESC_BOLD_ON, ESC_BOLD_OFF),
+    None: (b'', b''),
+}
+
+def render_escpos_receipt(sale, items, scrap_items):
+    """Render an invoice as raw ESC/POS bytes; the receipt is as long as its content"""
+    out = bytearray(ESC_INIT)
+    for style, text in thermal_receipt_lines(sale, items, scrap_items, app.config['THERMAL_LINE_WIDTH']):
+        start, end = ESC_STYLES[style]
+        out.extend(start + text.encode('cp437', errors='replace') + b'\n' + end)
+    out.extend(ESC_FEED_AND_CUT)
+    return bytes(out)
+
+def send_to_thermal_printer(data):
+    """Write raw receipt bytes to the configured printer socket or spool/device file"""
+    target = app.config['THERMAL_PRINTER']
+    if target.startswith('tcp://'):
+        host, _, port = target[len('tcp://'):].rpartition(':')
+        with socket.create_connection((host, int(port)), timeout=5) as conn:
+            conn.sendall(data)
+    else:
+        with open(target, 'ab') as f:
+            f.write(data)
+
+@app.route('/print_receipt/<invoice_number>')
+@login_required
+def print_receipt(invoice_number):
+    # Without a configured printer the invoice page offers the thermal PDF instead
+    if not app.config['THERMAL_PRINTER']:
+        return redirect(url_for('print_invoice', invoice_number=invoice_number, size='thermal'))
+    
+    sale = Sale.query.filter_by(invoice_number=invoice_number).first_or_404()
+    scrap_items = ScrapInventory.query.filter_by(sold_invoice=invoice_number).all()
+    receipt = render_escpos_receipt(sale, sale.lines, scrap_items)
+    
+    try:
+        send_to_thermal_printer(receipt)
+        flash(f'Receipt {invoice_number} sent to the thermal printer.', 'success')
+    except (OSError, ValueError) as e:
+        flash(f'Could not print receipt: {str(e)}', 'danger')
+    return redirect(url_for('invoice', invoice_number=invoice_number))
+
+@app.route('/daily_report')
+@login_required
+def daily_report():
+    report_date = parse_date(request.args.get('date'), local_now().date())
+    return render_template('daily_report.html', **daily_report_data(report_date))
+
+def daily_report_data(report_date):
+    """Sales of one local day with the totals shown on the daily report"""
     # Get sales for the date
+    day_start, day_end = local_day_range(report_date)
     sales = Sale.query.filter(
-        db.func.date(Sale.created_at) == report_date
-    ).all()
+        Sale.created_at >= day_start,
+        Sale.created_at < day_end
+    ).order_by(Sale.created_at).all()
     
     # Calculate totals
-    total_sales = len(sales)
-    total_revenue = sum(sale.total for sale in sales)
-    total_discount = sum(sale.discount for sale in sales)
-    total_scrap_deduction = sum(sale.scrap_deduction for sale in sales)
-    
-    return render_template('daily_report.html',
-                         sales=sales,
-                         report_date=report_date,
-                         total_sales=total_sales,
-                         total_revenue=total_revenue,
-                         total_discount=total_discount,
-                         total_scrap_deduction=total_scrap_deduction)
+    return {
+        'sales': sales,
+        'report_date': report_date,
+        'total_sales': len(sales),
+        'total_revenue': sum(sale.total for sale in sales),
+        'total_discount': sum(sale.discount for sale in sales),
+        'total_scrap_deduction': sum(sale.scrap_deduction for sale in sales)
+    }
+
+# End-of-day invoice batch
+def invoice_render_data(sale, lines, scrap_items):
+    """Picklable copy of an invoice so it can be rendered in another process"""
+    return (
+        SimpleNamespace(
+            invoice_number=sale.invoice_number, created_at=sale.created_at,
+            customer_name=sale.customer_name, customer_phone=sale.customer_phone,
+            subtotal=sale.subtotal, discount=sale.discount, scrap_deduction=sale.scrap_deduction,
+            total=sale.total, payment_method=sale.payment_method
+        ),
+        [SimpleNamespace(name=line.name, model=line.model, quantity=line.quantity, price=line.price, total=line.total)
+         for line in lines],
+        [SimpleNamespace(name=scrap.name, model=scrap.model, price=scrap.price) for scrap in scrap_items]
+    )
+
+def render_invoice_job(job):
+    """Process pool entry point: render one A4 invoice from invoice_render_data()"""
+    sale, items, scrap_items = job
+    return render_invoice_pdf(sale, items, scrap_items, 'a4')
+
+# Each worker shares one rendering pool between its request threads. The pool
+# only lives while batches are being rendered: it shuts down after
+# PDF_RENDER_POOL_IDLE seconds without one, so idle workers hold no processes.
+_render_pool = None
+_render_pool_pid = None
+_render_pool_lock = threading.Lock()
+_render_pool_batches = 0  # Batches currently rendering on the pool
+_render_pool_timer = None
+
+def acquire_render_pool():
+    """This worker's batch rendering pool, created on first use (again after a fork or a shutdown)"""
+    global _render_pool, _render_pool_pid, _render_pool_batches, _render_pool_timer
+    with _render_pool_lock:
+        if _render_pool_timer is not None:
+            _render_pool_timer.cancel()
+            _render_pool_timer = None
+        if _render_pool is None or _render_pool_pid != os.getpid():
+            from concurrent.futures import ProcessPoolExecutor
+            
+            workers = app.config['PDF_RENDER_PROCESSES'] or os.cpu_count() or 1
+            _render_pool = ProcessPoolExecutor(max_workers=workers, mp_context=process_pool_context())
+            _render_pool_pid = os.getpid()
+            _render_pool_batches = 0
+        _render_pool_batches += 1
+        return _render_pool
+
+def release_render_pool(pool, broken=False):
+    """Finish a batch: shut a broken pool down now, an idle one after PDF_RENDER_POOL_IDLE seconds"""
+    global _render_pool, _render_pool_batches, _render_pool_timer
+    with _render_pool_lock:
+        if pool is not _render_pool:
+            return
+        _render_pool_batches -= 1
+        if not broken:
+            if not _render_pool_batches:
+                _render_pool_timer = threading.Timer(app.config['PDF_RENDER_POOL_IDLE'], shutdown_idle_render_pool)
+                _render_pool_timer.daemon = True
+                _render_pool_timer.start()
+            return
+        _render_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def shutdown_idle_render_pool():
+    global _render_pool, _render_pool_timer
+    with _render_pool_lock:
+        if _render_pool is None or _render_pool_batches or _render_pool_pid != os.getpid():
+            return
+        pool, _render_pool, _render_pool_timer = _render_pool, None, None
+    pool.shutdown(wait=False)
+
+def render_invoices_in_pool(jobs):
+    """Render invoices on the PDF_RENDER_PROCESSES pool, preserving order"""
+    from concurrent.futures.process import BrokenProcessPool
+    
+    workers = min(app.config['PDF_RENDER_PROCESSES'] or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        return [render_invoice_job(job) for job in jobs]
+    
+    pool = acquire_render_pool()
+    broken = False
+    try:
+        return list(pool.map(render_invoice_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    except BrokenProcessPool:
+        # A pool process died; the next batch starts a fresh pool
+        broken = True
+        raise
+    finally:
+        release_render_pool(pool, broken)
+
+def render_daily_summary_pdf(report):
+    """Cover page for the end-of-day batch with the daily report totals and invoice list"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib import colors
+    
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    styles = getSampleStyleSheet()
+    elements = [
+        Paragraph(f"<para alignment='center'><font size='16'><b>{app.config['SHOP_NAME']}</b></font></para>", styles["Normal"]),
+        Spacer(1, 10),
+        Paragraph(f"<para alignment='center'><font size='13'>Daily Sales Summary - {report['report_date'].strftime('%B %d, %Y')}</font></para>", styles["Normal"]),
+        Spacer(1, 20)
+    ]
+    
+    totals = Table([
+        ['Total Sales', str(report['total_sales'])],
+        ['Total Revenue', f"Rs. {report['total_revenue']:.2f}"],
+        ['Total Discount', f"Rs. {report['total_discount']:.2f}"],
+        ['Scrap Deduction', f"Rs. {report['total_scrap_deduction']:.2f}"]
+    ], colWidths=[200, 150])
+    totals.setStyle(TableStyle([
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+    ]))
+    elements.append(totals)
+    elements.append(Spacer(1, 20))
+    
+    table_data = [['Invoice', 'Time', 'Customer', 'Payment', 'Total']]
+    for sale in report['sales']:
+        table_data.append([
+            sale.invoice_number,
+            localtime(sale.created_at).strftime('%H:%M'),
+            (sale.customer_name or '')[:30],
+            sale.payment_method,
+            f"Rs. {sale.total:.2f}"
+        ])
+    invoices = Table(table_data, colWidths=[120, 50, 160, 70, 90], repeatRows=1)
+    invoices.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+    ]))
+    elements.append(invoices)
+    
+    doc.build(elements)
+    return buffer.getvalue()
+
+@app.route('/daily_invoices_pdf')
+@login_required
+def daily_invoices_pdf():
+    """One PDF with a summary page followed by every A4 invoice of the day"""
+    from pypdf import PdfWriter
+    
+    report_date = parse_date(request.args.get('date'), local_now().date())
+    report = daily_report_data(report_date)
+    sales = report['sales']
+    
+    # Line items and scrap items for the whole day in two queries
+    lines_by_sale = {}
+    scrap_by_invoice = {}
+    if sales:
+        for line in SaleLine.query.filter(SaleLine.sale_id.in_([sale.id for sale in sales])).order_by(SaleLine.id):
+            lines_by_sale.setdefault(line.sale_id, []).append(line)
+        for scrap in ScrapInventory.query.filter(ScrapInventory.sold_invoice.in_([sale.invoice_number for sale in sales])):
+            scrap_by_invoice.setdefault(scrap.sold_invoice, []).append(scrap)
+    
+    # Reuse cached invoices and render the rest in parallel
+    pdfs = [None] * len(sales)
+    pending = {}
+    for index, sale in enumerate(sales):
+        try:
+            with open(invoice_cache_path(sale.invoice_number, 'a4'), 'rb') as f:
+                pdfs[index] = f.read()
+        except FileNotFoundError:
+            pending[index] = invoice_render_data(sale, lines_by_sale.get(sale.id, []),
+                                                 scrap_by_invoice.get(sale.invoice_number, []))
+    if pending:
+        for index, pdf in zip(pending, render_invoices_in_pool(list(pending.values()))):
+            pdfs[index] = pdf
+            store_cached_invoice(invoice_cache_path(sales[index].invoice_number, 'a4'), pdf, evict=False)
+        evict_invoice_cache()
+    
+    writer = PdfWriter()
+    writer.append(io.BytesIO(render_daily_summary_pdf(report)))
+    for pdf in pdfs:
+        writer.append(io.BytesIO(pdf))
+    output = io.BytesIO()
+    writer.write(output)
+    output.seek(0)
+    
+    return send_file(output, as_attachment=True,
+                     download_name=f"invoices_{report_date.strftime('%Y-%m-%d')}.pdf", mimetype='application/pdf')
 
 @app.route('/profit_loss')
 @login_required
 def profit_loss():
-    start_date = request.args.get('start_date', (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d'))
-    end_date = request.args.get('end_date', datetime.now().strftime('%Y-%m-%d'))
+    today = local_now().date()
+    start = parse_date(request.args.get('start_date'), today - timedelta(days=30))
+    end = parse_date(request.args.get('end_date'), today)
+    start_date = start.strftime('%Y-%m-%d')
+    end_date = end.strftime('%Y-%m-%d')
     
-    # Get sales in date range
-    sales = Sale.query.filter(
-        Sale.created_at >= start_date,
-        Sale.created_at <= end_date + ' 23:59:59'
-    ).all()
+    range_start, range_end = local_day_range(start, end)
+    in_range = (Sale.created_at >= range_start, Sale.created_at < range_end)
     
-    # Get all batteries for cost calculation
-    batteries = Battery.query.all()
-    battery_dict = {battery.barcode: battery for battery in batteries}
+    # Range totals; the id bounds let the page query walk the primary key
+    # over just this range instead of scanning from the first sale
+    total_count, total_revenue, first_id, last_id = db.session.query(
+        db.func.count(Sale.id), db.func.coalesce(db.func.sum(Sale.total), 0),
+        db.func.min(Sale.id), db.func.max(Sale.id)
+    ).filter(*in_range).one()
     
-    # Calculate profit/loss
-    total_revenue = sum(sale.total for sale in sales)
-    total_cost = 0
+    # Estimated cost from current purchase prices: units sold per barcode,
+    # so each battery is looked up once rather than once per line
+    units = db.session.query(
+        SaleLine.barcode.label('barcode'), db.func.sum(SaleLine.quantity).label('quantity')
+    ).join(Sale, SaleLine.sale_id == Sale.id).filter(*in_range).group_by(SaleLine.barcode).subquery()
+    total_cost = db.session.query(
+        db.func.coalesce(db.func.sum(units.c.quantity * Battery.purchase_price), 0)
+    ).select_from(units).join(Battery, Battery.barcode == units.c.barcode).scalar()
     
-    for sale in sales:
-        items = json.loads(sale.items)
-        for item in items:
-            battery = battery_dict.get(item['barcode'])
-            if battery:
-                total_cost += battery.purchase_price * item['quantity']
+    # One page of detail rows with only the displayed columns and each
+    # sale's cost aggregated from its lines in the same query
+    sale_cost = db.session.query(
+        db.func.coalesce(db.func.sum(SaleLine.quantity * Battery.purchase_price), 0)
+    ).join(Battery, SaleLine.barcode == Battery.barcode).filter(
+        SaleLine.sale_id == Sale.id
+    ).correlate(Sale).scalar_subquery()
+    rows, prev_cursor, next_cursor = [], None, None
+    if total_count:
+        rows, prev_cursor, next_cursor = keyset_page(
+            db.session.query(
+                Sale.id, Sale.created_at, Sale.invoice_number, Sale.customer_name, Sale.total,
+                sale_cost.label('cost')
+            ).filter(Sale.id.between(first_id, last_id), *in_range),
+            Sale.id,
+            after=request.args.get('after', type=int),
+            before=request.args.get('before', type=int)
+        )
     
     total_profit = total_revenue - total_cost
     profit_margin = (total_profit / total_revenue * 100) if total_revenue > 0 else 0
     
     return render_template('profit_loss.html',
-                         sales=sales,
+                         rows=rows,
+                         prev_cursor=prev_cursor,
+                         next_cursor=next_cursor,
+                         total_count=total_count,
                          start_date=start_date,
                          end_date=end_date,
                          total_revenue=total_revenue,
                          total_cost=total_cost,
                          total_profit=total_profit,
-                         profit_margin=profit_margin,
-                         batteries=batteries)
+                         profit_margin=profit_margin)
+
+SALES_EXPORT_SALE_COLUMNS = [
+    'invoice_number', 'created_at_utc', 'customer_name', 'customer_phone', 'subtotal',
+    'discount', 'scrap_deduction', 'total', 'payment_method', 'created_by'
+]
+SALES_EXPORT_LINE_COLUMNS = ['barcode', 'name', 'model', 'quantity', 'price', 'line_total']
+
+@app.route('/export_sales')
+@login_required
+def export_sales():
+    """Stream every sale in a date range with its line items as CSV (one row per line) or NDJSON (one object per sale)"""
+    from sqlalchemy import select
+    
+    today = local_now().date()
+    start = parse_date(request.args.get('start_date'), today)
+    end = parse_date(request.args.get('end_date'), start)
+    export_format = 'ndjson' if request.args.get('format') == 'ndjson' else 'csv'
+    range_start, range_end = local_day_range(start, end)
+    
+    stmt = select(
+        Sale.id, Sale.invoice_number, Sale.created_at, Sale.customer_name, Sale.customer_phone,
+        Sale.subtotal, Sale.discount, Sale.scrap_deduction, Sale.total, Sale.payment_method,
+        Sale.created_by, SaleLine.barcode, SaleLine.name, SaleLine.model, SaleLine.quantity,
+        SaleLine.price, SaleLine.total
+    ).outerjoin(SaleLine, SaleLine.sale_id == Sale.id).where(
+        Sale.created_at >= range_start,
+        Sale.created_at < range_end
+    ).order_by(Sale.created_at, Sale.id, SaleLine.id).execution_options(
+        yield_per=app.config['EXPORT_BATCH_SIZE']
+    )
+    
+    def split_row(row):
+        sale = [row[1], row[2].isoformat() if row[2] else None] + list(row[3:11])
+        line = list(row[11:]) if row[11] is not None or row[12] is not None else None
+        return row[0], sale, line
+    
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(SALES_EXPORT_SALE_COLUMNS + SALES_EXPORT_LINE_COLUMNS)
+        for row in db.session.execute(stmt):
+            _, sale, line = split_row(row)
+            writer.writerow(sale + (line or [''] * len(SALES_EXPORT_LINE_COLUMNS)))
+            if buffer.tell() > 65536:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    def generate_ndjson():
+        current_id = None
+        record = None
+        for row in db.session.execute(stmt):
+            sale_id, sale, line = split_row(row)
+            if sale_id != current_id:
+                if record is not None:
+                    yield json.dumps(record) + '\n'
+                current_id = sale_id
+                record = dict(zip(SALES_EXPORT_SALE_COLUMNS, sale))
+                record['items'] = []
+            if line:
+                record['items'].append(dict(zip(SALES_EXPORT_LINE_COLUMNS, line)))
+        if record is not None:
+            yield json.dumps(record) + '\n'
+    
+    if export_format == 'ndjson':
+        generator, mimetype = generate_ndjson(), 'application/x-ndjson'
+    else:
+        generator, mimetype = generate_csv(), 'text/csv'
+    filename = f"sales_{start.strftime('%Y-%m-%d')}_{end.strftime('%Y-%m-%d')}.{export_format}"
+    return Response(stream_with_context(generator), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
 
 @app.route('/scrap_inventory', methods=['GET', 'POST'])
 @login_required
@@ -707,18 +2334,44 @@ def scrap_inventory():
         flash('Scrap item added successfully!', 'success')
         return redirect(url_for('scrap_inventory'))
     
-    scraps = ScrapInventory.query.all()
-    return render_template('scrap_inventory.html', scraps=scraps)
+    filters = {
+        'model': request.args.get('model', '').strip(),
+        'reason': request.args.get('reason', '')
+    }
+    
+    query = ScrapInventory.query
+    if filters['model']:
+        query = query.filter(ScrapInventory.model.startswith(filters['model']))
+    if filters['reason']:
+        query = query.filter(ScrapInventory.reason == filters['reason'])
+    
+    # Newest entries first
+    scraps, prev_cursor, next_cursor = keyset_page(
+        query, ScrapInventory.id,
+        after=request.args.get('after', type=int),
+        before=request.args.get('before', type=int),
+        descending=True
+    )
+    
+    # Footer totals for the whole filtered set
+    total_count, total_value = query.with_entities(
+        db.func.count(ScrapInventory.id),
+        db.func.coalesce(db.func.sum(ScrapInventory.price), 0)
+    ).one()
+    
+    return render_template('scrap_inventory.html',
+                         scraps=scraps,
+                         filters=filters,
+                         prev_cursor=prev_cursor,
+                         next_cursor=next_cursor,
+                         total_count=total_count,
+                         total_value=total_value)
 
 @app.route('/search_battery')
 @login_required
 def search_battery():
-    query = request.args.get('q', '')
-    batteries = Battery.query.filter(
-        (Battery.barcode.contains(query)) |
-        (Battery.name.contains(query)) |
-        (Battery.model.contains(query))
-    ).limit(10).all()
+    query = request.args.get('q', '').strip()
+    batteries = search_batteries(query)
     
     results = []
     for battery in batteries:
@@ -733,6 +2386,32 @@ def search_battery():
     
     return jsonify(results)
 
+@app.route('/scan', methods=['GET', 'POST'])
+@login_required
+def scan():
+    """Resolve scanned barcodes to cart-ready records in one round trip.
+    
+    Accepts ?q=<code> (repeatable) or a JSON body {"barcodes": [...]}.
+    Suggestions are only searched for codes without an exact match.
+    """
+    codes = request.args.getlist('q')
+    if request.is_json:
+        payload = request.get_json(silent=True)
+        barcodes = payload.get('barcodes', []) if isinstance(payload, dict) else None
+        if not isinstance(barcodes, list) or not all(isinstance(code, str) for code in barcodes):
+            return jsonify({'error': 'barcodes must be a list of strings'}), 400
+        codes += barcodes
+    codes = [str(code).strip() for code in codes if str(code).strip()][:app.config['SCAN_BATCH_LIMIT']]
+    
+    matches = battery_cache.get_many(codes)
+    results = []
+    for code in codes:
+        match = matches.get(code)
+        suggestions = [] if match else [battery_record(battery) for battery in search_batteries(code, limit=5)]
+        results.append({'query': code, 'match': match, 'suggestions': suggestions})
+    
+    return jsonify({'results': results})
+
 @app.route('/delete_scrap/<int:id>')
 @login_required
 @admin_required
@@ -740,9 +2419,61 @@ def delete_scrap(id):
     scrap = ScrapInventory.query.get_or_404(id)
     db.session.delete(scrap)
     db.session.commit()
+    if scrap.sold_invoice:
+        invalidate_cached_invoices(scrap.sold_invoice)
     flash('Scrap item deleted successfully!', 'success')
     return redirect(url_for('scrap_inventory'))
 
+@app.cli.command('wal-checkpoint')
+@click.option('--mode', default='TRUNCATE', type=click.Choice(['PASSIVE', 'FULL', 'RESTART', 'TRUNCATE']),
+              help='Checkpoint mode (default: TRUNCATE, which waits for readers and blocks writers).')
+def wal_checkpoint_command(mode):
+    """Checkpoint the SQLite WAL; run TRUNCATE off-hours to shrink a large log"""
+    busy, log_pages, checkpointed = wal_checkpoint(mode)
+    if busy:
+        raise click.ClickException(f'Checkpoint could not finish: {checkpointed} of {log_pages} WAL pages copied')
+    click.echo(f'✓ {mode} checkpoint copied {checkpointed} of {log_pages} WAL pages')
+
+@app.cli.command('import-report')
+@click.option('--module', default='app', help='Module to import, as a gunicorn worker would.')
+@click.option('--top', default=15, help='Number of packages to list.')
+def import_report(module, top):
+    """Show where worker boot time goes, using python -X importtime"""
+    import subprocess
+    import sys
+    
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, cwd=app.root_path)
+    
+    # Children are printed before their parent, so collect depth-1 imports
+    # until the top-level line for the module itself shows up
+    total = 0
+    packages = {}
+    children = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name[1:]  # Drop the column separator's space; two more per nesting level
+        depth = (len(name) - len(name.lstrip())) // 2
+        name = name.strip()
+        if depth == 1:
+            root = name.split('.')[0]
+            children[root] = children.get(root, 0) + int(cumulative)
+        elif depth == 0:
+            if name == module:
+                total, packages = int(cumulative), children
+            children = {}
+    
+    if not total:
+        click.echo(result.stderr[-2000:], err=True)
+        raise click.ClickException(f'Could not import {module}')
+    
+    click.echo(f'Importing {module} took {total / 1000:.1f} ms')
+    click.echo(f"{'package':<30}{'ms':>10}{'share':>8}")
+    for name, cumulative in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+        click.echo(f'{name:<30}{cumulative / 1000:>10.1f}{cumulative / total:>8.0%}')
+
 def create_templates():
     """Create all template files"""
     templates = {
@@ -968,7 +2699,7 @@ def create_templates():
                             <tr>
                                 <td>{{ sale.invoice_number }}</td>
                                 <td>{{ sale.customer_name }}</td>
-                                <td>{{ sale.created_at.strftime('%Y-%m-%d %H:%M') }}</td>
+                                <td>{{ (sale.created_at|localtime).strftime('%Y-%m-%d %H:%M') }}</td>
                                 <td>Rs. {{ "%.2f"|format(sale.total) }}</td>
                                 <td><span class="badge bg-info">{{ sale.payment_method }}</span></td>
                                 <td>
@@ -992,6 +2723,7 @@ def create_templates():
 {% block content %}
 <div class="d-flex justify-content-between flex-wrap flex-md-nowrap align-items-center pt-3 pb-2 mb-3 border-bottom">
     <h1 class="h2"><i class="bi bi-plus-circle"></i> Add New Battery</h1>
+    <a href="{{ url_for('import_inventory') }}" class="btn btn-outline-primary"><i class="bi bi-upload"></i> Bulk Import CSV</a>
 </div>
 
 <div class="row">
@@ -1058,6 +2790,38 @@ def create_templates():
     <h1 class="h2"><i class="bi bi-view-list"></i> Battery Inventory</h1>
 </div>
 
+<div class="card mb-4">
+    <div class="card-body">
+        <form method="GET" action="{{ url_for('view_inventory') }}" class="row g-2 align-items-end">
+            <div class="col-md-3">
+                <label class="form-label">Company</label>
+                <select class="form-select" name="company">
+                    <option value="">All Companies</option>
+                    {% for company in companies %}
+                    <option value="{{ company }}" {% if filters.company == company %}selected{% endif %}>{{ company }}</option>
+                    {% endfor %}
+                </select>
+            </div>
+            <div class="col-md-3">
+                <label class="form-label">Model</label>
+                <input type="text" class="form-control" name="model" value="{{ filters.model }}" placeholder="Model starts with">
+            </div>
+            <div class="col-md-3">
+                <label class="form-label">Stock</label>
+                <select class="form-select" name="stock">
+                    <option value="">All</option>
+                    <option value="in" {% if filters.stock == 'in' %}selected{% endif %}>In Stock</option>
+                    <option value="low" {% if filters.stock == 'low' %}selected{% endif %}>Low Stock (&lt; 5)</option>
+                    <option value="out" {% if filters.stock == 'out' %}selected{% endif %}>Out of Stock</option>
+                </select>
+            </div>
+            <div class="col-md-3">
+                <button type="submit" class="btn btn-primary w-100"><i class="bi bi-funnel"></i> Filter</button>
+            </div>
+        </form>
+    </div>
+</div>
+
 <div class="card">
     <div class="card-header">
         <h5>All Batteries</h5>
@@ -1106,8 +2870,25 @@ def create_templates():
                     </tr>
                     {% endfor %}
                 </tbody>
+                <tfoot class="table-dark">
+                    <tr>
+                        <td colspan="4" class="text-end"><strong>{{ total_count }} Batteries | Stock Value:</strong></td>
+                        <td colspan="2"><strong>Rs. {{ "%.2f"|format(stock_value) }}</strong></td>
+                        <td colspan="2"><strong>{{ total_units }}</strong></td>
+                    </tr>
+                </tfoot>
             </table>
         </div>
+        <nav class="d-flex justify-content-between">
+            {% if prev_cursor %}
+            <a href="{{ url_for('view_inventory', before=prev_cursor, **filters) }}" class="btn btn-outline-secondary"><i class="bi bi-chevron-left"></i> Previous</a>
+            {% else %}
+            <span></span>
+            {% endif %}
+            {% if next_cursor %}
+            <a href="{{ url_for('view_inventory', after=next_cursor, **filters) }}" class="btn btn-outline-secondary">Next <i class="bi bi-chevron-right"></i></a>
+            {% endif %}
+        </nav>
     </div>
 </div>
 {% endblock %}""",
@@ -1212,14 +2993,18 @@ $(document).ready(function() {
 function searchBarcode(query) {
     if(!query) return;
     
-    $.get('/search_battery?q=' + query, function(batteries) {
-        if(batteries.length > 0) {
-            const exactMatch = batteries.find(b => b.barcode === query);
-            if(exactMatch) {
-                addToCart(exactMatch.barcode);
-            } else {
-                $('#searchResults').empty();
-                batteries.forEach(function(battery) {
+    // Several barcodes (e.g. a scanned stack pasted at once) resolve in one request;
+    // they are separated by newlines, commas or semicolons so free text like
+    // "Exide 55Ah" stays a single search
+    const codes = query.split(String.fromCharCode(10)).join(',').split(/[,;]+/)
+        .map(code => code.trim()).filter(code => code);
+    $.get('{{ url_for("scan") }}', $.param({q: codes}, true), function(response) {
+        $('#searchResults').empty();
+        response.results.forEach(function(result) {
+            if(result.match) {
+                addRecordToCart(result.match);
+            } else if(result.suggestions.length > 0) {
+                result.suggestions.forEach(function(battery) {
                     $('#searchResults').append(`
                         <div class="list-group-item list-group-item-action" onclick="addToCart('${battery.barcode}')">
                             <div class="d-flex w-100 justify-content-between">
@@ -1231,52 +3016,54 @@ function searchBarcode(query) {
                         </div>
                     `);
                 });
+            } else {
+                $('#searchResults').append(`<div class="text-muted p-2">No batteries found for ${result.query}</div>`);
             }
-        } else {
-            $('#searchResults').html('<div class="text-muted p-2">No batteries found</div>');
-        }
+        });
     });
 }
 
 function addToCart(barcode) {
     $.get('/get_battery_info/' + barcode, function(response) {
         if(response.success) {
-            const battery = response.data;
-            
-            if(battery.quantity <= 0) {
-                alert('This item is out of stock!');
-                return;
-            }
-            
-            const existingItem = cartItems.find(item => item.barcode === barcode);
-            
-            if(existingItem) {
-                if(existingItem.quantity >= battery.quantity) {
-                    alert('Cannot add more than available stock!');
-                    return;
-                }
-                existingItem.quantity += 1;
-                existingItem.total = existingItem.quantity * existingItem.price;
-            } else {
-                cartItems.push({
-                    barcode: barcode,
-                    name: battery.name,
-                    model: battery.model,
-                    price: battery.selling_price,
-                    quantity: 1,
-                    total: battery.selling_price
-                });
-            }
-            
-            updateCart();
+            addRecordToCart(response.data);
             $('#searchResults').empty();
-            $('#barcode_input').focus();
         } else {
             alert('Battery not found in inventory!');
         }
     });
 }
 
+function addRecordToCart(battery) {
+    if(battery.quantity <= 0) {
+        alert(battery.name + ' is out of stock!');
+        return;
+    }
+    
+    const existingItem = cartItems.find(item => item.barcode === battery.barcode);
+    
+    if(existingItem) {
+        if(existingItem.quantity >= battery.quantity) {
+            alert('Cannot add more than available stock!');
+            return;
+        }
+        existingItem.quantity += 1;
+        existingItem.total = existingItem.quantity * existingItem.price;
+    } else {
+        cartItems.push({
+            barcode: battery.barcode,
+            name: battery.name,
+            model: battery.model,
+            price: battery.selling_price,
+            quantity: 1,
+            total: battery.selling_price
+        });
+    }
+    
+    updateCart();
+    $('#barcode_input').focus();
+}
+
 function updateCart() {
     let subtotal = 0;
     let html = '';
@@ -1632,17 +3419,57 @@ $(document).ready(function() {
         
         'invoice.html': """{% extends "base.html" %}
 {% block title %}Invoice{% endblock %}
+{% block extra_js %}
+<script>
+// Render the A4 PDF on the server's background pool and download it when ready
+function printA4(event) {
+    event.preventDefault();
+    $('#printA4Btn').addClass('disabled');
+    $.post('{{ url_for("print_invoice_async", invoice_number=sale.invoice_number, size="a4") }}', pollPdfJob)
+        .fail(printA4Directly);
+}
+
+function pollPdfJob(job) {
+    if(job.status === 'done') {
+        $('#printA4Btn').removeClass('disabled');
+        window.location = job.download_url;
+    } else if(job.status === 'failed') {
+        $('#printA4Btn').removeClass('disabled');
+        alert('Could not generate PDF: ' + job.error);
+    } else {
+        setTimeout(function() {
+            $.get(job.status_url, pollPdfJob).fail(printA4Directly);
+        }, 500);
+    }
+}
+
+function printA4Directly() {
+    $('#printA4Btn').removeClass('disabled');
+    window.location = $('#printA4Btn').attr('href');
+}
+
+$(document).ready(function() {
+    $('#printA4Btn').on('click', printA4);
+});
+</script>
+{% endblock %}
 {% block content %}
 <div class="container">
     <div class="d-flex justify-content-between align-items-center mb-4">
         <h1><i class="bi bi-receipt"></i> Invoice</h1>
         <div>
-            <a href="{{ url_for('print_invoice', invoice_number=sale.invoice_number, size='a4') }}" class="btn btn-primary">
+            <a href="{{ url_for('print_invoice', invoice_number=sale.invoice_number, size='a4') }}" class="btn btn-primary" id="printA4Btn">
                 <i class="bi bi-printer"></i> Print A4
             </a>
+            {% if config.THERMAL_PRINTER %}
+            <a href="{{ url_for('print_receipt', invoice_number=sale.invoice_number) }}" class="btn btn-secondary">
+                <i class="bi bi-printer"></i> Print Thermal
+            </a>
+            {% else %}
             <a href="{{ url_for('print_invoice', invoice_number=sale.invoice_number, size='thermal') }}" class="btn btn-secondary">
                 <i class="bi bi-printer"></i> Print Thermal
             </a>
+            {% endif %}
             <a href="{{ url_for('dashboard') }}" class="btn btn-outline-secondary">
                 <i class="bi bi-house"></i> Dashboard
             </a>
@@ -1662,7 +3489,7 @@ $(document).ready(function() {
             <div class="row mb-4">
                 <div class="col-md-6">
                     <p><strong>Invoice Number:</strong> {{ sale.invoice_number }}</p>
-                    <p><strong>Date:</strong> {{ sale.created_at.strftime('%Y-%m-%d %H:%M:%S') }}</p>
+                    <p><strong>Date:</strong> {{ (sale.created_at|localtime).strftime('%Y-%m-%d %H:%M:%S') }}</p>
                 </div>
                 <div class="col-md-6">
                     <p><strong>Customer Name:</strong> {{ sale.customer_name }}</p>
@@ -1754,6 +3581,17 @@ $(document).ready(function() {
 {% block content %}
 <div class="d-flex justify-content-between flex-wrap flex-md-nowrap align-items-center pt-3 pb-2 mb-3 border-bottom">
     <h1 class="h2"><i class="bi bi-file-text"></i> Daily Sales Report</h1>
+    <div class="btn-group mb-2 mb-md-0">
+        <a href="{{ url_for('export_sales', start_date=report_date.strftime('%Y-%m-%d'), end_date=report_date.strftime('%Y-%m-%d'), format='csv') }}" class="btn btn-sm btn-outline-secondary">
+            <i class="bi bi-download"></i> Export CSV
+        </a>
+        <a href="{{ url_for('export_sales', start_date=report_date.strftime('%Y-%m-%d'), end_date=report_date.strftime('%Y-%m-%d'), format='ndjson') }}" class="btn btn-sm btn-outline-secondary">
+            <i class="bi bi-download"></i> Export NDJSON
+        </a>
+        <a href="{{ url_for('daily_invoices_pdf', date=report_date.strftime('%Y-%m-%d')) }}" class="btn btn-sm btn-outline-primary">
+            <i class="bi bi-printer"></i> Print All Invoices
+        </a>
+    </div>
 </div>
 
 <div class="row mb-4">
@@ -1814,7 +3652,7 @@ $(document).ready(function() {
                     {% for sale in sales %}
                     <tr>
                         <td>{{ sale.invoice_number }}</td>
-                        <td>{{ sale.created_at.strftime('%H:%M') }}</td>
+                        <td>{{ (sale.created_at|localtime).strftime('%H:%M') }}</td>
                         <td>{{ sale.customer_name }}</td>
                         <td>Rs. {{ "%.2f"|format(sale.subtotal) }}</td>
                         <td class="text-danger">Rs. {{ "%.2f"|format(sale.discount) }}</td>
@@ -1874,9 +3712,9 @@ $(document).ready(function() {
 </div>
 
 <div class="card">
-    <div class="card-header"><h5>Sales Details</h5></div>
+    <div class="card-header"><h5>Sales Details ({{ total_count }} sales, {{ start_date }} to {{ end_date }})</h5></div>
     <div class="card-body">
-        {% if sales %}
+        {% if rows %}
         <div class="table-responsive">
             <table class="table table-hover">
                 <thead>
@@ -1890,30 +3728,32 @@ $(document).ready(function() {
                     </tr>
                 </thead>
                 <tbody>
-                    {% for sale in sales %}
-                    {% set items = sale.items|fromjson %}
-                    {% set sale_cost = 0 %}
-                    {% for item in items %}
-                        {% set battery = batteries|selectattr("barcode", "equalto", item.barcode)|first %}
-                        {% if battery %}
-                            {% set sale_cost = sale_cost + (battery.purchase_price * item.quantity) %}
-                        {% endif %}
-                    {% endfor %}
-                    {% set sale_profit = sale.total - sale_cost %}
+                    {% for row in rows %}
+                    {% set profit = row.total - row.cost %}
                     <tr>
-                        <td>{{ sale.created_at.strftime('%Y-%m-%d') }}</td>
-                        <td>{{ sale.invoice_number }}</td>
-                        <td>{{ sale.customer_name }}</td>
-                        <td>Rs. {{ "%.2f"|format(sale.total) }}</td>
-                        <td>Rs. {{ "%.2f"|format(sale_cost) }}</td>
-                        <td class="{% if sale_profit >= 0 %}text-success{% else %}text-danger{% endif %}">
-                            Rs. {{ "%.2f"|format(sale_profit) }}
+                        <td>{{ (row.created_at|localtime).strftime('%Y-%m-%d') }}</td>
+                        <td>{{ row.invoice_number }}</td>
+                        <td>{{ row.customer_name }}</td>
+                        <td>Rs. {{ "%.2f"|format(row.total) }}</td>
+                        <td>Rs. {{ "%.2f"|format(row.cost) }}</td>
+                        <td class="{% if profit >= 0 %}text-success{% else %}text-danger{% endif %}">
+                            Rs. {{ "%.2f"|format(profit) }}
                         </td>
                     </tr>
                     {% endfor %}
                 </tbody>
             </table>
         </div>
+        <nav class="d-flex justify-content-between">
+            {% if prev_cursor %}
+            <a href="{{ url_for('profit_loss', before=prev_cursor, start_date=start_date, end_date=end_date) }}" class="btn btn-outline-secondary"><i class="bi bi-chevron-left"></i> Previous</a>
+            {% else %}
+            <span></span>
+            {% endif %}
+            {% if next_cursor %}
+            <a href="{{ url_for('profit_loss', after=next_cursor, start_date=start_date, end_date=end_date) }}" class="btn btn-outline-secondary">Next <i class="bi bi-chevron-right"></i></a>
+            {% endif %}
+        </nav>
         {% else %}
         <div class="text-center py-5">
             <h4 class="text-muted">No sales found in this date range</h4>
@@ -1983,6 +3823,22 @@ $(document).ready(function() {
 <div class="card">
     <div class="card-header"><h5>Scrap Battery Records</h5></div>
     <div class="card-body">
+        <form method="GET" action="{{ url_for('scrap_inventory') }}" class="row g-2 align-items-end mb-3">
+            <div class="col-md-4">
+                <input type="text" class="form-control" name="model" value="{{ filters.model }}" placeholder="Model starts with">
+            </div>
+            <div class="col-md-4">
+                <select class="form-select" name="reason">
+                    <option value="">All Reasons</option>
+                    {% for reason in ['Defective', 'Damaged', 'Expired', 'Returned', 'Manual Entry', 'Other'] %}
+                    <option value="{{ reason }}" {% if filters.reason == reason %}selected{% endif %}>{{ reason }}</option>
+                    {% endfor %}
+                </select>
+            </div>
+            <div class="col-md-4">
+                <button type="submit" class="btn btn-primary w-100"><i class="bi bi-funnel"></i> Filter</button>
+            </div>
+        </form>
         {% if scraps %}
         <div class="table-responsive">
             <table class="table table-hover">
@@ -2001,7 +3857,7 @@ $(document).ready(function() {
                 <tbody>
                     {% for scrap in scraps %}
                     <tr>
-                        <td>{{ scrap.created_at.strftime('%Y-%m-%d') }}</td>
+                        <td>{{ (scrap.created_at|localtime).strftime('%Y-%m-%d') }}</td>
                         <td>{{ scrap.name }}</td>
                         <td>{{ scrap.model or '-' }}</td>
                         <td>{{ scrap.barcode or '-' }}</td>
@@ -2028,14 +3884,24 @@ $(document).ready(function() {
                 </tbody>
                 <tfoot class="table-dark">
                     <tr>
-                        <td colspan="4" class="text-end"><strong>Total Scrap Value:</strong></td>
+                        <td colspan="4" class="text-end"><strong>Total Scrap Value ({{ total_count }} items):</strong></td>
                         <td colspan="4">
-                            <strong>Rs. {{ "%.2f"|format(scraps|sum(attribute='price')) }}</strong>
+                            <strong>Rs. {{ "%.2f"|format(total_value) }}</strong>
                         </td>
                     </tr>
                 </tfoot>
             </table>
         </div>
+        <nav class="d-flex justify-content-between">
+            {% if prev_cursor %}
+            <a href="{{ url_for('scrap_inventory', before=prev_cursor, **filters) }}" class="btn btn-outline-secondary"><i class="bi bi-chevron-left"></i> Newer</a>
+            {% else %}
+            <span></span>
+            {% endif %}
+            {% if next_cursor %}
+            <a href="{{ url_for('scrap_inventory', after=next_cursor, **filters) }}" class="btn btn-outline-secondary">Older <i class="bi bi-chevron-right"></i></a>
+            {% endif %}
+        </nav>
         {% else %}
         <div class="text-center py-5">
             <h4 class="text-muted">No scrap items found</h4>
@@ -2043,13 +3909,95 @@ $(document).ready(function() {
         {% endif %}
     </div>
 </div>
+{% endblock %}""",
+        
+        'import_inventory.html': """{% extends "base.html" %}
+{% block title %}Import Inventory{% endblock %}
+{% block content %}
+<div class="d-flex justify-content-between flex-wrap flex-md-nowrap align-items-center pt-3 pb-2 mb-3 border-bottom">
+    <h1 class="h2"><i class="bi bi-upload"></i> Bulk Import Inventory</h1>
+</div>
+
+<div class="row">
+    <div class="col-md-8">
+        <div class="card mb-4">
+            <div class="card-header"><h5>Upload CSV</h5></div>
+            <div class="card-body">
+                <form method="POST" action="{{ url_for('import_inventory') }}" enctype="multipart/form-data">
+                    <div class="mb-3">
+                        <label for="file" class="form-label">CSV File *</label>
+                        <input type="file" class="form-control" id="file" name="file" accept=".csv,text/csv" required>
+                        <small class="text-muted">Columns: {{ columns|join(', ') }} (barcode, name and both prices are required)</small>
+                    </div>
+                    <div class="form-check mb-3">
+                        <input type="checkbox" class="form-check-input" id="update_existing" name="update_existing" value="1">
+                        <label for="update_existing" class="form-check-label">Update existing barcodes (replace the details given in the file and add quantity to stock)</label>
+                    </div>
+                    <button type="submit" class="btn btn-primary"><i class="bi bi-upload"></i> Import</button>
+                    <a href="{{ url_for('view_inventory') }}" class="btn btn-secondary"><i class="bi bi-x-circle"></i> Cancel</a>
+                </form>
+            </div>
+        </div>
+    </div>
+</div>
+
+{% if result %}
+<div class="card">
+    <div class="card-header"><h5>Import Report</h5></div>
+    <div class="card-body">
+        <p>
+            <span class="badge bg-success">{{ result.inserted }} added</span>
+            <span class="badge bg-info">{{ result.updated }} updated</span>
+            <span class="badge bg-danger">{{ result.errors|length }} rejected</span>
+        </p>
+        {% if result.stopped %}
+        <div class="alert alert-danger">
+            The file could not be read after line {{ result.stopped }}.
+            {% if result.committed_line %}Lines 2 to {{ result.committed_line }} were saved; later lines were not imported.{% else %}No rows were saved.{% endif %}
+        </div>
+        {% endif %}
+        {% if result.errors %}
+        <div class="table-responsive">
+            <table class="table table-sm table-hover">
+                <thead>
+                    <tr>
+                        <th>Line</th>
+                        <th>Barcode</th>
+                        <th>Error</th>
+                    </tr>
+                </thead>
+                <tbody>
+                    {% for error in result.errors[:500] %}
+                    <tr>
+                        <td>{{ error.line }}</td>
+                        <td>{{ error.barcode or '-' }}</td>
+                        <td class="text-danger">{{ error.error }}</td>
+                    </tr>
+                    {% endfor %}
+                </tbody>
+            </table>
+            {% if result.errors|length > 500 %}
+            <p class="text-muted">Showing the first 500 of {{ result.errors|length }} rejected rows.</p>
+            {% endif %}
+        </div>
+        {% endif %}
+    </div>
+</div>
+{% endif %}
 {% endblock %}"""
     }
     
+    # Only rewrite files whose content changed, so template mtimes (and
+    # with them Jinja's compiled template caches) survive restarts
     for filename, content in templates.items():
         filepath = os.path.join('templates', filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(content)
+        data = content.encode('utf-8')
+        if os.path.exists(filepath):
+            with open(filepath, 'rb') as f:
+                if hashlib.sha256(f.read()).digest() == hashlib.sha256(data).digest():
+                    continue
+        with open(filepath, 'wb') as f:
+            f.write(data)
         print(f"✓ Created template: {filename}")
 
 if __name__ == '__main__':
@@ -2061,11 +4009,16 @@ if __name__ == '__main__':
     # Create all template files
     create_templates()
     
+    # Apply pending schema migrations
+    with app.app_context():
+        upgrade_database()
+    
     print("\n" + "="*60)
     print("BATTERY STORE MANAGEMENT SYSTEM")
     print("="*60)
-    print("\n✓ All templates created successfully!")
-    print("✓ Database initialized and updated with scrap_deduction column")
+    print("\n✓ All templates are up to date")
+    print("✓ Database schema is up to date")
+    print("\nIn production run `flask --app app upgrade-db` before starting workers")
     print("\nAccess the application at: http://localhost:5000")
     print("Login credentials: admin / admin123")
     print("\nKey Features:")
@@ -0,0 +1,547 @@
+"""Benchmark commands for the battery store: bench-sqlite, bench-routes and bench-checkout.
+
+The app itself never imports this module; load it through flask to get the
+commands, e.g. `flask --app bench bench-routes`. Worker functions live at
+module level because the benchmarks run them in fresh spawn processes bound to
+a bench database.
+"""
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import click
+
+from app import (app, db, Battery, Sale, SaleLine, ScrapInventory, SQLITE_PROFILES, apply_sqlite_pragmas,
+                 local_now, sale_line_rows, upgrade_database)
+
+BENCH_COMPANIES = ['Exide', 'AGS', 'Osaka', 'Phoenix', 'Volta', 'Daewoo']
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)"""
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def generate_bench_data(conn, batteries=500, sales=20000, scrap=0, days=90, seed=0, chunk_size=10000):
+    """Fill an empty database with a deterministic shop history.
+    
+    Writes batteries, sales (items JSON plus sale_line rows, spread evenly over
+    the last `days` days), scrap items and matching invoice counters through a
+    raw sqlite3 connection in chunks, so millions of rows load without holding
+    them all in memory.
+    """
+    import random
+    
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    start = now - timedelta(days=days)
+    stamp = lambda moment: moment.strftime('%Y-%m-%d %H:%M:%S.%f')
+    
+    stock = []
+    for i in range(batteries):
+        company = BENCH_COMPANIES[i % len(BENCH_COMPANIES)]
+        purchase = rng.randrange(8000, 40000, 500)
+        stock.append({
+            'barcode': f'BAT{i:06d}', 'name': f'{company} {rng.choice([35, 45, 55, 70, 100])}Ah',
+            'model': f'{company[:2].upper()}-{i % 97:02d}', 'company': company,
+            'weight': rng.randrange(8, 30), 'purchase_price': purchase,
+            'selling_price': purchase + rng.randrange(1000, 6000, 500), 'quantity': rng.randrange(0, 50),
+            'created_at': stamp(start)
+        })
+    conn.executemany("""
+        INSERT INTO battery (barcode, name, model, company, weight, purchase_price, selling_price, quantity, created_at, updated_at)
+        VALUES (:barcode, :name, :model, :company, :weight, :purchase_price, :selling_price, :quantity, :created_at, :created_at)
+    """, stock)
+    conn.commit()
+    
+    step = days * 86400 / max(sales, 1)
+    counters = {}
+    for chunk_start in range(0, sales, chunk_size):
+        sale_rows, line_rows = [], []
+        for sale_id in range(chunk_start + 1, min(chunk_start + chunk_size, sales) + 1):
+            moment = start + timedelta(seconds=(sale_id - 1 + rng.random()) * step)
+            day = moment.strftime('%Y%m%d')
+            counters[day] = counters.get(day, 0) + 1
+            items = []
+            for battery in rng.sample(stock, min(len(stock), rng.randint(1, 3))):
+                quantity = rng.randint(1, 2)
+                items.append({'barcode': battery['barcode'], 'name': battery['name'], 'model': battery['model'],
+                              'price': battery['selling_price'], 'quantity': quantity,
+                              'total': battery['selling_price'] * quantity})
+            subtotal = sum(item['total'] for item in items)
+            discount = rng.choice([0, 0, 0, 500, 1000])
+            sale_rows.append({
+                'id': sale_id, 'invoice_number': f'INV-{day}-{counters[day]:04d}',
+                'customer_name': f'Customer {rng.randrange(1000)}', 'customer_phone': f'0300{rng.randrange(10 ** 7):07d}',
+                'items': json.dumps(items), 'subtotal': subtotal, 'discount': discount, 'scrap_deduction': 0,
+                'total': subtotal - discount, 'payment_method': rng.choice(['cash', 'card', 'bank']),
+                'created_by': 'admin', 'created_at': stamp(moment)
+            })
+            line_rows.extend(sale_line_rows(sale_id, items))
+        conn.executemany("""
+            INSERT INTO sale (id, invoice_number, customer_name, customer_phone, items, subtotal, discount,
+                              scrap_deduction, total, payment_method, created_by, created_at)
+            VALUES (:id, :invoice_number, :customer_name, :customer_phone, :items, :subtotal, :discount,
+                    :scrap_deduction, :total, :payment_method, :created_by, :created_at)
+        """, sale_rows)
+        conn.executemany("""
+            INSERT INTO sale_line (sale_id, barcode, name, model, quantity, price, total)
+            VALUES (:sale_id, :barcode, :name, :model, :quantity, :price, :total)
+        """, line_rows)
+        conn.commit()
+    conn.executemany("INSERT OR REPLACE INTO invoice_counter (day, last_number) VALUES (?, ?)", counters.items())
+    
+    for chunk_start in range(0, scrap, chunk_size):
+        conn.executemany("""
+            INSERT INTO scrap_inventory (name, model, weight, price, reason, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [(f'Scrap {i}', f'SC-{i % 50:02d}', rng.randrange(5, 30), rng.randrange(500, 5000, 100),
+               rng.choice(['Dead cell', 'Cracked case', 'Trade-in']),
+               stamp(start + timedelta(seconds=rng.randrange(days * 86400))))
+              for i in range(chunk_start, min(chunk_start + chunk_size, scrap))])
+    conn.commit()
+
+def create_bench_database(path, **dataset):
+    """Create the app schema in a new SQLite file and fill it with generate_bench_data()"""
+    from sqlalchemy import create_engine
+    
+    engine = create_engine(f'sqlite:///{path}')
+    db.metadata.create_all(engine)
+    engine.dispose()
+    
+    conn = sqlite3.connect(path)
+    generate_bench_data(conn, **dataset)
+    conn.close()
+
+BENCH_READ_SQL = [
+    # What profit_loss() runs for the last 30 days
+    "SELECT * FROM sale WHERE created_at >= ? ORDER BY created_at",
+    """SELECT sale_line.sale_id, sum(sale_line.quantity * battery.purchase_price)
+       FROM sale_line JOIN sale ON sale_line.sale_id = sale.id
+       JOIN battery ON sale_line.barcode = battery.barcode
+       WHERE sale.created_at >= ? GROUP BY sale_line.sale_id""",
+]
+
+def sqlite_bench_worker(path, pragmas, role, duration, seed):
+    """One reader or writer process of bench-sqlite, returning its latencies and lock errors"""
+    import random
+    
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path, isolation_level=None)
+    apply_sqlite_pragmas(conn, pragmas)
+    barcodes = [row[0] for row in conn.execute('SELECT barcode FROM battery')]
+    since = (datetime.utcnow() - timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S')
+    
+    latencies, locked = [], 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            if role == 'read':
+                # Like a profit_loss request: both queries in one read transaction
+                conn.execute('BEGIN')
+                for sql in BENCH_READ_SQL:
+                    conn.execute(sql, (since,)).fetchall()
+                conn.execute('COMMIT')
+            else:
+                # Like billing(): one sale, two lines, two stock updates
+                conn.execute('BEGIN IMMEDIATE')
+                sale_id = conn.execute("""
+                    INSERT INTO sale (invoice_number, items, subtotal, discount, scrap_deduction, total, created_at)
+                    VALUES (?, '[]', 300, 0, 0, 300, ?)
+                """, (f'BENCH-{seed}-{len(latencies)}-{locked}', datetime.utcnow().isoformat(' '))).lastrowid
+                for barcode in rng.sample(barcodes, 2):
+                    conn.execute("""
+                        INSERT INTO sale_line (sale_id, barcode, quantity, price, total) VALUES (?, ?, 1, 150, 150)
+                    """, (sale_id, barcode))
+                    conn.execute("UPDATE battery SET quantity = quantity - 1 WHERE barcode = ?", (barcode,))
+                conn.execute('COMMIT')
+            latencies.append(time.perf_counter() - started)
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e) and 'busy' not in str(e):
+                raise
+            locked += 1
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+    conn.close()
+    return {'role': role, 'latencies': latencies, 'locked': locked}
+
+@app.cli.command('bench-sqlite')
+@click.option('--profile', 'profiles', multiple=True, type=click.Choice(sorted(SQLITE_PROFILES)),
+              help='Profile to measure; repeat for several (default: all).')
+@click.option('--readers', default=2, help='Reader processes running profit/loss queries.')
+@click.option('--writers', default=2, help='Writer processes inserting sales.')
+@click.option('--duration', default=10.0, help='Seconds to run each profile.')
+@click.option('--batteries', default=500, help='Batteries in the generated database.')
+@click.option('--sales', default=20000, help='Sales in the generated database.')
+def bench_sqlite(profiles, readers, writers, duration, batteries, sales):
+    """Measure mixed read/write throughput under each SQLite profile"""
+    import shutil
+    import tempfile
+    
+    workdir = tempfile.mkdtemp(prefix='bench-sqlite-')
+    try:
+        seed_path = os.path.join(workdir, 'seed.db')
+        create_bench_database(seed_path, batteries=batteries, sales=sales)
+        
+        click.echo(f"{'profile':<10}{'reads/s':>9}{'writes/s':>10}{'read p95':>10}{'write p95':>11}{'locked':>8}")
+        for profile in profiles or SQLITE_PROFILES:
+            path = os.path.join(workdir, f'{profile}.db')
+            shutil.copy(seed_path, path)
+            pragmas = SQLITE_PROFILES[profile]
+            
+            jobs = [(path, pragmas, 'read', duration, i) for i in range(readers)]
+            jobs += [(path, pragmas, 'write', duration, readers + i) for i in range(writers)]
+            with multiprocessing.Pool(len(jobs)) as pool:
+                results = pool.starmap(sqlite_bench_worker, jobs)
+            
+            reads = [latency for result in results if result['role'] == 'read' for latency in result['latencies']]
+            writes = [latency for result in results if result['role'] == 'write' for latency in result['latencies']]
+            locked = sum(result['locked'] for result in results)
+            click.echo(f'{profile:<10}{len(reads) / duration:>9.1f}{len(writes) / duration:>10.1f}'
+                       f'{percentile(reads, 95) * 1000:>8.1f}ms{percentile(writes, 95) * 1000:>9.1f}ms{locked:>8}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+# Routes timed by bench-routes; {barcode}, {battery_id}, {invoice} and {date}
+# are filled per request from the dataset. daily_invoices_pdf renders every
+# invoice of a day, so it only runs when asked for with --route.
+BENCH_ROUTES = {
+    'dashboard': ('GET', '/dashboard'),
+    'view_inventory': ('GET', '/view_inventory'),
+    'view_inventory_filtered': ('GET', '/view_inventory?company=Exide&stock=low'),
+    'edit_inventory': ('GET', '/edit_inventory/{battery_id}'),
+    'get_battery_info': ('GET', '/get_battery_info/{barcode}'),
+    'search_battery': ('GET', '/search_battery?q=Exide 55'),
+    'scan': ('GET', '/scan?q={barcode}'),
+    'billing_form': ('GET', '/billing'),
+    'billing': ('POST', '/billing'),
+    'invoice': ('GET', '/invoice/{invoice}'),
+    'print_invoice_a4': ('GET', '/print_invoice/{invoice}/a4'),
+    'print_invoice_thermal': ('GET', '/print_invoice/{invoice}/thermal'),
+    'print_receipt': ('GET', '/print_receipt/{invoice}'),
+    'daily_report': ('GET', '/daily_report?date={date}'),
+    'daily_invoices_pdf': ('GET', '/daily_invoices_pdf?date={date}'),
+    'profit_loss': ('GET', '/profit_loss'),
+    'export_sales': ('GET', '/export_sales?start_date={date}&end_date={date}'),
+    'scrap_inventory': ('GET', '/scrap_inventory'),
+}
+BENCH_DEFAULT_ROUTES = [name for name in BENCH_ROUTES if name != 'daily_invoices_pdf']
+
+@contextmanager
+def bench_database_url(database):
+    """Point DATABASE_URL at `database` while spawning bench processes.
+    
+    The engine is bound when the app is imported, so only processes started
+    inside this block use the bench database.
+    """
+    previous_url = os.environ.get('DATABASE_URL')
+    os.environ['DATABASE_URL'] = f'sqlite:///{database}'
+    try:
+        yield
+    finally:
+        if previous_url is None:
+            os.environ.pop('DATABASE_URL')
+        else:
+            os.environ['DATABASE_URL'] = previous_url
+
+def run_in_bench_process(database, func, *args):
+    """Call func(*args) in a fresh process whose app is bound to `database`"""
+    with bench_database_url(database):
+        with multiprocessing.get_context('spawn').Pool(1) as pool:
+            return pool.apply(func, args)
+
+def seed_route_bench(database, dataset, seed=0):
+    """Create the schema in `database` and fill it with generate_bench_data()"""
+    import contextlib
+    import sys
+    
+    with app.app_context(), contextlib.redirect_stdout(sys.stderr):
+        upgrade_database()
+    conn = sqlite3.connect(database)
+    generate_bench_data(conn, seed=seed, **dataset)
+    conn.close()
+
+def run_route_bench(database, routes, iterations, seed=0):
+    """Time each route through the test client against `database`.
+    
+    billing posts real sales, so bench-routes hands this a scratch copy of
+    the database rather than the file given with --database.
+    """
+    import contextlib
+    import random
+    import sys
+    from sqlalchemy import event
+    
+    rng = random.Random(seed)
+    app.config['INVOICE_CACHE_DIR'] = os.path.join(os.path.dirname(database), 'invoice_cache')
+    
+    with app.app_context(), contextlib.redirect_stdout(sys.stderr):
+        upgrade_database()
+        barcodes, battery_ids = zip(*db.session.query(Battery.barcode, Battery.id).all())
+        sale_count = Sale.query.count()
+        invoices = [invoice for (invoice,) in db.session.query(Sale.invoice_number).filter(
+            Sale.id.in_([rng.randint(1, sale_count) for _ in range(1000)]))]
+        yesterday = (local_now() - timedelta(days=1)).strftime('%Y-%m-%d')
+        volumes = {
+            'batteries': len(barcodes),
+            'sales': sale_count,
+            'sale_lines': SaleLine.query.count(),
+            'scrap': ScrapInventory.query.count(),
+        }
+        
+        queries = [0]
+        def count_query(*args):
+            queries[0] += 1
+        event.listen(db.engine, 'before_cursor_execute', count_query)
+    
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    
+    results = {}
+    for name in routes:
+        method, url = BENCH_ROUTES[name]
+        timings, query_counts, statuses = [], [], {}
+        # One unmeasured request first, so template compilation isn't counted
+        for i in range(iterations + 1):
+            barcode = rng.choice(barcodes)
+            target = url.format(barcode=barcode, battery_id=rng.choice(battery_ids),
+                                invoice=rng.choice(invoices), date=yesterday)
+            data = None
+            if method == 'POST':
+                data = {'items': json.dumps([{'barcode': barcode, 'name': barcode, 'model': '',
+                                               'price': 1000, 'quantity': 1, 'total': 1000}]),
+                        'payment_method': 'cash'}
+            
+            queries[0] = 0
+            started = time.perf_counter()
+            response = client.open(target, method=method, data=data)
+            response.get_data()
+            elapsed = time.perf_counter() - started
+            response.close()
+            if i:
+                timings.append(elapsed)
+                query_counts.append(queries[0])
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        
+        results[name] = {
+            'method': method,
+            'path': url,
+            'p50_ms': round(percentile(timings, 50) * 1000, 2),
+            'p95_ms': round(percentile(timings, 95) * 1000, 2),
+            'max_ms': round(max(timings) * 1000, 2),
+            'queries_p50': percentile(query_counts, 50),
+            'queries_max': max(query_counts),
+            'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        }
+    return {'dataset': volumes, 'routes': results}
+
+@app.cli.command('bench-routes')
+@click.option('--database', type=click.Path(dir_okay=False), default=None,
+              help='SQLite file to benchmark, generated if missing; keep it to compare commits on the same data. '
+                   'Routes run against a temporary copy, so the file is never modified.')
+@click.option('--batteries', default=10000, help='Batteries to generate.')
+@click.option('--sales', default=200000, help='Sales to generate.')
+@click.option('--scrap', default=20000, help='Scrap items to generate.')
+@click.option('--days', default=90, help='Days of history the generated sales span.')
+@click.option('--seed', default=0, help='Random seed for the data and the requests.')
+@click.option('--route', 'routes', multiple=True, type=click.Choice(list(BENCH_ROUTES)),
+              help='Route to time; repeat for several (default: all but daily_invoices_pdf).')
+@click.option('--iterations', default=20, help='Timed requests per route.')
+@click.option('--output', type=click.File('w'), default='-', help='JSON output file (default: stdout).')
+def bench_routes(database, batteries, sales, scrap, days, seed, routes, iterations, output):
+    """Time each route against a generated database and report p50/p95 latency and query counts as JSON"""
+    import shutil
+    import subprocess
+    import tempfile
+    
+    workdir = tempfile.mkdtemp(prefix='bench-routes-')
+    scratch = os.path.join(workdir, 'bench.db')
+    try:
+        dataset = {'batteries': batteries, 'sales': sales, 'scrap': scrap, 'days': days}
+        if not database:
+            click.echo('Generating a temporary database ...', err=True)
+            run_in_bench_process(scratch, seed_route_bench, scratch, dataset, seed)
+        else:
+            database = os.path.abspath(database)
+            if not os.path.exists(database):
+                os.makedirs(os.path.dirname(database), exist_ok=True)
+                click.echo(f'Generating {database} ...', err=True)
+                run_in_bench_process(database, seed_route_bench, database, dataset, seed)
+            # The backup API also copies anything still in the -wal file
+            source, target = sqlite3.connect(database), sqlite3.connect(scratch)
+            source.backup(target)
+            source.close()
+            target.close()
+        
+        report = run_in_bench_process(scratch, run_route_bench, scratch, list(routes or BENCH_DEFAULT_ROUTES), iterations, seed)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=app.root_path)
+    report = {'commit': commit.stdout.strip() or None, 'iterations': iterations, **report}
+    json.dump(report, output, indent=2)
+    output.write('\n')
+
+def prepare_checkout_bench(hot_barcodes, stock):
+    """Create the schema and the contended batteries for bench-checkout"""
+    import contextlib
+    import sys
+    
+    with app.app_context(), contextlib.redirect_stdout(sys.stderr):
+        upgrade_database()
+        for barcode in hot_barcodes:
+            db.session.add(Battery(barcode=barcode, name=f'Battery {barcode}', model=barcode, company='Bench',
+                                   purchase_price=800, selling_price=1000, quantity=stock))
+        db.session.commit()
+
+def checkout_worker(cashier, profile, hot_barcodes, checkouts, max_items, barrier, results):
+    """One cashier process of bench-checkout: post carts to billing() and report what happened"""
+    import random
+    from sqlalchemy import event
+    
+    app.config['SQLITE_PROFILE'] = profile
+    rng = random.Random(cashier)
+    lock_waits = []
+    
+    # BEGIN IMMEDIATE is where billing() waits for the write lock
+    def before_execute(conn, cursor, statement, *args):
+        if statement == 'BEGIN IMMEDIATE':
+            conn.info['lock_requested'] = time.perf_counter()
+    def after_execute(conn, cursor, statement, *args):
+        if statement == 'BEGIN IMMEDIATE':
+            lock_waits.append(time.perf_counter() - conn.info.pop('lock_requested'))
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', before_execute)
+        event.listen(db.engine, 'after_cursor_execute', after_execute)
+    
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    client.get('/billing')
+    
+    outcomes = {'sold': 0, 'out_of_stock': 0, 'locked': 0, 'error': 0}
+    latencies, invoices, errors = [], [], []
+    sold = {}
+    barrier.wait()
+    started = time.time()
+    for _ in range(checkouts):
+        cart = {barcode: rng.randint(1, 2) for barcode in rng.sample(hot_barcodes, rng.randint(1, max_items))}
+        items = [{'barcode': barcode, 'name': f'Battery {barcode}', 'model': barcode, 'price': 1000,
+                  'quantity': quantity, 'total': 1000 * quantity} for barcode, quantity in cart.items()]
+        
+        request_started = time.perf_counter()
+        response = client.post('/billing', data={'items': json.dumps(items), 'customer_name': f'Cashier {cashier}',
+                                                 'payment_method': 'cash'})
+        latencies.append(time.perf_counter() - request_started)
+        
+        location = response.headers.get('Location', '')
+        if '/invoice/' in location:
+            outcomes['sold'] += 1
+            invoices.append(location.rsplit('/', 1)[-1])
+            for barcode, quantity in cart.items():
+                sold[barcode] = sold.get(barcode, 0) + quantity
+            continue
+        with client.session_transaction() as flask_session:
+            message = flask_session.pop('_flashes', [('', '')])[-1][1]
+        if message.startswith('Not enough stock'):
+            outcomes['out_of_stock'] += 1
+        elif 'locked' in message or 'busy' in message:
+            outcomes['locked'] += 1
+        else:
+            outcomes['error'] += 1
+            errors.append(message)
+    
+    results.put({'started': started, 'finished': time.time(), 'outcomes': outcomes, 'latencies': latencies,
+                 'lock_waits': lock_waits, 'invoices': invoices, 'sold': sold, 'errors': errors[:5]})
+
+@app.cli.command('bench-checkout')
+@click.option('--cashiers', default=8, help='Cashier processes billing at the same time.')
+@click.option('--checkouts', default=50, help='Carts each cashier submits.')
+@click.option('--hot-barcodes', default=5, help='Batteries every cashier sells from.')
+@click.option('--stock', default=20, help='Starting quantity of each battery.')
+@click.option('--max-items', default=3, help='Most batteries in one cart.')
+@click.option('--profile', default=lambda: app.config['SQLITE_PROFILE'], type=click.Choice(sorted(SQLITE_PROFILES)),
+              help='SQLite profile the cashiers connect with.')
+def bench_checkout(cashiers, checkouts, hot_barcodes, stock, max_items, profile):
+    """Simulate concurrent cashiers against billing() and check invoices and stock afterwards"""
+    import shutil
+    import tempfile
+    
+    barcodes = [f'HOT{i:03d}' for i in range(hot_barcodes)]
+    max_items = min(max_items, hot_barcodes)
+    workdir = tempfile.mkdtemp(prefix='bench-checkout-')
+    database = os.path.join(workdir, 'checkout.db')
+    
+    # Cashiers are fresh processes bound to the bench database, like gunicorn workers
+    try:
+        run_in_bench_process(database, prepare_checkout_bench, barcodes, stock)
+        with bench_database_url(database):
+            context = multiprocessing.get_context('spawn')
+            barrier = context.Barrier(cashiers)
+            queue = context.Queue()
+            processes = [context.Process(target=checkout_worker,
+                                         args=(cashier, profile, barcodes, checkouts, max_items, barrier, queue))
+                         for cashier in range(cashiers)]
+            for process in processes:
+                process.start()
+            reports = [queue.get() for _ in processes]
+            for process in processes:
+                process.join()
+        
+        conn = sqlite3.connect(database)
+        duplicates = conn.execute(
+            "SELECT invoice_number FROM sale GROUP BY invoice_number HAVING count(*) > 1").fetchall()
+        final_stock = dict(conn.execute("SELECT barcode, quantity FROM battery"))
+        sold_lines = dict(conn.execute("SELECT barcode, sum(quantity) FROM sale_line GROUP BY barcode"))
+        conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    outcomes = {}
+    for report in reports:
+        for outcome, count in report['outcomes'].items():
+            outcomes[outcome] = outcomes.get(outcome, 0) + count
+    latencies = [latency for report in reports for latency in report['latencies']]
+    lock_waits = [wait for report in reports for wait in report['lock_waits']]
+    invoices = [invoice for report in reports for invoice in report['invoices']]
+    elapsed = max(report['finished'] for report in reports) - min(report['started'] for report in reports)
+    
+    reported_sold = {}
+    for report in reports:
+        for barcode, quantity in report['sold'].items():
+            reported_sold[barcode] = reported_sold.get(barcode, 0) + quantity
+    
+    # Stock is oversold if a quantity went negative or sales exceed what was on
+    # the shelf, and mismatched if the shelf, the sale lines and what cashiers
+    # were told they sold disagree
+    oversold, mismatched = [], []
+    for barcode in barcodes:
+        sold = sold_lines.get(barcode, 0)
+        if final_stock[barcode] < 0 or sold > stock:
+            oversold.append(barcode)
+        if final_stock[barcode] != stock - sold or reported_sold.get(barcode, 0) != sold:
+            mismatched.append(barcode)
+    duplicate_invoices = len(invoices) - len(set(invoices)) + len(duplicates)
+    
+    click.echo(f'{cashiers} cashiers x {checkouts} carts on {hot_barcodes} batteries of {stock} ({profile} profile)')
+    click.echo(f"Completed sales:      {outcomes['sold']} ({outcomes['sold'] / elapsed:.1f}/s over {elapsed:.2f}s)")
+    click.echo(f'Carts attempted:      {len(latencies)} ({len(latencies) / elapsed:.1f}/s)')
+    click.echo(f"Out of stock:         {outcomes['out_of_stock']}")
+    click.echo(f"Database locked:      {outcomes['locked']}")
+    click.echo(f"Other errors:         {outcomes['error']}")
+    click.echo(f'Checkout latency:     p50 {percentile(latencies, 50) * 1000:.1f}ms, p95 {percentile(latencies, 95) * 1000:.1f}ms')
+    click.echo(f'Write lock wait:      p50 {percentile(lock_waits, 50) * 1000:.1f}ms, p95 {percentile(lock_waits, 95) * 1000:.1f}ms, '
+               f'total {sum(lock_waits):.2f}s')
+    click.echo(f'Duplicate invoices:   {duplicate_invoices}')
+    click.echo(f'Oversold batteries:   {len(oversold)}')
+    click.echo(f'Stock mismatches:     {len(mismatched)}')
+    for message in {message for report in reports for message in report['errors']}:
+        click.echo(f'  error: {message}')
+    
+    if duplicate_invoices or oversold or mismatched:
+        raise click.ClickException('Billing produced duplicate invoices or wrong stock under contention')
@@ -3,9 +3,41 @@ from datetime import datetime
 
 class Config:
     SECRET_KEY = 'your-secret-key-here-change-in-production'
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///database.db'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///database.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SHOP_NAME = "Haideri Battery Store"
     SHOP_ADDRESS = "NoorKot Road, Sakhargarh"
     SALESMAN_NAME = "Musawar Apal"
-    PHONE_NUMBER = "03005016501"
\ No newline at end of file
+    PHONE_NUMBER = "03005016501"
+    DASHBOARD_CACHE_TTL = 30  # Seconds to reuse dashboard counters
+    TIMEZONE = None  # Shop timezone, e.g. 'Asia/Karachi' (None = server local time)
+    BATTERY_CACHE_SIZE = 2048  # Barcodes kept in each worker's lookup cache
+    BATTERY_CACHE_CHECK_INTERVAL = 1.0  # Seconds between shared generation checks
+    SCAN_BATCH_LIMIT = 100  # Most barcodes resolved by one /scan request
+    PAGE_SIZE = 50  # Rows per page on inventory and scrap lists
+    EXPORT_BATCH_SIZE = 1000  # Rows fetched per batch when streaming exports
+    IMPORT_BATCH_SIZE = 1000  # Rows written per transaction by the CSV import
+    INVOICE_CACHE_DIR = os.path.join('instance', 'invoice_cache')
+    INVOICE_CACHE_MAX_BYTES = 200 * 1024 * 1024  # Rendered PDFs kept on disk
+    INVOICE_CACHE_SCAN_INTERVAL = 300  # Seconds before a worker re-measures the shared PDF cache
+    INVOICE_TEMPLATE_VERSION = 2  # Bump when the PDF layout changes
+    THERMAL_PRINTER = None  # 'tcp://host:9100', a device/spool file path, or None to print the thermal PDF
+    THERMAL_LINE_WIDTH = 32  # Characters per line (32 for 58mm paper, 48 for 80mm)
+    PDF_RENDER_PROCESSES = None  # Processes for batch PDF rendering (None = CPU count)
+    PDF_RENDER_POOL_IDLE = 60  # Seconds without a batch before a worker stops its render processes
+    PDF_JOB_EXECUTOR = 'thread'  # Background PDF jobs run on a 'thread' or 'process' pool
+    PDF_JOB_WORKERS = 2  # Background PDF jobs rendered at once per gunicorn worker
+    PDF_JOB_TIMEOUT = 120  # Seconds before a pending PDF job counts as failed
+    JINJA_CACHE_DIR = os.path.join('instance', 'jinja_cache')  # Compiled templates (None to disable)
+    SQLITE_PROFILE = 'wal'  # Connection pragma profile, see SQLITE_PROFILES in app.py
+    SQLITE_PRAGMAS = {}  # Pragmas overriding the profile, e.g. {'busy_timeout': 10000}
+    SQLITE_CHECKPOINT_INTERVAL = 60  # Seconds between background WAL checkpoints (None to disable)
+    SQLITE_WAL_TRUNCATE_BYTES = 64 * 1024 * 1024  # WAL size to truncate once fully checkpointed with no readers
+    METRICS_ENABLED = True  # Record per-endpoint latency and SQL counts for /metrics
+    METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # Latency histogram bounds (s)
+    SLOW_QUERY_THRESHOLD_MS = None  # Log statements slower than this (None = off)
+    SLOW_QUERY_LOG = os.path.join('instance', 'slow_queries.log')
+    SLOW_QUERY_LOG_BYTES = 5 * 1024 * 1024  # Size at which the slow-query log rotates
+    SLOW_QUERY_LOG_BACKUPS = 5  # Rotated slow-query logs kept
+    SLOW_QUERY_SCAN_TABLES = ('sale', 'battery', 'scrap_inventory')  # Full scans flagged in the log
+    PROFILER_TOP = 30  # Functions listed when an admin adds ?profile to a page
\ No newline at end of file